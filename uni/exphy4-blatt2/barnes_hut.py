@@ -0,0 +1,223 @@
+"""Barnes–Hut approximation of the inverse square field.
+
+The bodies are sorted along a Morton (Z-order) curve, which turns the
+quadtree (2-D) or octree (3-D) into contiguous ranges of the sorted
+arrays: every node on level `l` is a run of bodies whose Morton codes
+agree in their leading `l * dimension` bits. The tree walk is done for
+many target bodies at once by keeping a frontier of (target, node)
+pairs per level. A node is accepted when `width / distance < θ`, and
+its contribution is then taken from a monopole and dipole expansion
+around the centre of `|s|`, which keeps the approximation useful for
+mixed-sign sources like charges of both signs.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+
+Level = namedtuple(
+    "Level",
+    "keys, start, count, centre, monopole, dipole, width, "
+    "child_start, child_count",
+)
+
+
+def morton_codes(cells, depth):
+    codes = np.zeros(len(cells), dtype=np.int64)
+    dimension = cells.shape[1]
+    for bit in range(depth):
+        for axis in range(dimension):
+            codes |= ((cells[:, axis] >> bit) & 1) << (bit * dimension + axis)
+    return codes
+
+
+class Tree(object):
+    def __init__(self, r, s, leaf_size=8, depth=None):
+        r = np.asarray(r, dtype=float)
+        s = np.asarray(s, dtype=float)
+        self.dimension = r.shape[1]
+        if depth is None:
+            depth = 62 // self.dimension
+        self.depth = depth
+        self.leaf_size = leaf_size
+
+        lower = r.min(axis=0)
+        size = (r.max(axis=0) - lower).max() * (1 + 1e-9) or 1
+        cells = ((r - lower) / size * 2 ** depth).astype(np.int64)
+        codes = morton_codes(np.clip(cells, 0, 2 ** depth - 1), depth)
+
+        self.order = np.argsort(codes, kind="stable")
+        self.codes = codes[self.order]
+        self.r = r[self.order]
+        self.s = s[self.order]
+
+        self.levels = []
+        for level in range(depth + 1):
+            self.levels.append(self._build_level(level, size))
+            if self.levels[-1].count.max() <= leaf_size:
+                break
+        self._link_children()
+
+    def _shift(self, level):
+        return self.dimension * (self.depth - level)
+
+    def _build_level(self, level, size):
+        keys, start, count = np.unique(
+            self.codes >> self._shift(level),
+            return_index=True,
+            return_counts=True,
+        )
+        monopole = np.add.reduceat(self.s, start)
+        weight = np.add.reduceat(np.abs(self.s), start)
+        weighted = np.add.reduceat(np.abs(self.s)[:, None] * self.r, start)
+        mean = np.add.reduceat(self.r, start) / count[:, None]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            centre = np.where(
+                weight[:, None] > 0, weighted / weight[:, None], mean
+            )
+        dipole = (
+            np.add.reduceat(self.s[:, None] * self.r, start)
+            - monopole[:, None] * centre
+        )
+        return Level(
+            keys, start, count, centre, monopole, dipole,
+            size / 2 ** level, None, None,
+        )
+
+    def _link_children(self):
+        for level, children in zip(
+                range(len(self.levels) - 1), self.levels[1:]):
+            parent = self.levels[level]
+            parent_keys = children.keys >> self.dimension
+            child_start = np.searchsorted(parent_keys, parent.keys, "left")
+            child_stop = np.searchsorted(parent_keys, parent.keys, "right")
+            self.levels[level] = parent._replace(
+                child_start=child_start,
+                child_count=child_stop - child_start,
+            )
+
+    def field(self, θ=0.5, softening=0, chunk=4096):
+        """Approximate field at every body, in the original order."""
+        field = np.zeros_like(self.r)
+        for start in range(0, len(self.r), chunk):
+            targets = np.arange(start, min(start + chunk, len(self.r)))
+            field[targets] = self._walk(targets, θ, softening)
+        result = np.empty_like(field)
+        result[self.order] = field
+        return result
+
+    def _walk(self, targets, θ, softening):
+        field = np.zeros((len(targets), self.dimension))
+        # `t` indexes into `targets`, `n` into the nodes of the level.
+        t = np.arange(len(targets))
+        n = np.zeros(len(targets), dtype=np.int64)
+        for level_index, level in enumerate(self.levels):
+            if not len(t):
+                break
+            x = self.r[targets[t]]
+            R = x - level.centre[n]
+            distance_squared = np.einsum("ij,ij->i", R, R) + softening ** 2
+            contains = (
+                self.codes[targets[t]] >> self._shift(level_index)
+                == level.keys[n]
+            )
+            accept = ~contains & (
+                level.width ** 2 < θ ** 2 * distance_squared
+            )
+            self._accumulate(
+                field, t[accept],
+                self._multipole(level, n[accept], R[accept],
+                                distance_squared[accept]),
+            )
+
+            is_leaf = level.count[n] <= self.leaf_size
+            if level.child_start is None:
+                is_leaf[:] = True
+            direct = ~accept & is_leaf
+            self._direct(field, targets, t[direct], level, n[direct],
+                         softening)
+            if level.child_start is None:
+                break
+
+            opened = ~accept & ~is_leaf
+            t, n = expand(
+                t[opened],
+                level.child_start[n[opened]],
+                level.child_count[n[opened]],
+            )
+        return field
+
+    @staticmethod
+    def _multipole(level, n, R, distance_squared):
+        inverse_cube = distance_squared ** -1.5
+        p = level.dipole[n]
+        p_dot_R = np.einsum("ij,ij->i", p, R)
+        return (
+            (-level.monopole[n] * inverse_cube)[:, None] * R
+            + inverse_cube[:, None] * p
+            - (3 * p_dot_R * inverse_cube / distance_squared)[:, None] * R
+        )
+
+    def _direct(self, field, targets, t, level, n, softening):
+        t, j = expand(t, level.start[n], level.count[n])
+        distinct = targets[t] != j
+        t, j = t[distinct], j[distinct]
+        d = self.r[j] - self.r[targets[t]]
+        distance_squared = np.einsum("ij,ij->i", d, d) + softening ** 2
+        self._accumulate(
+            field, t, (self.s[j] * distance_squared ** -1.5)[:, None] * d
+        )
+
+    @staticmethod
+    def _accumulate(field, t, contributions):
+        for axis in range(field.shape[1]):
+            field[:, axis] += np.bincount(
+                t, contributions[:, axis], minlength=len(field)
+            )
+
+
+def expand(t, start, count):
+    """Pair every `t[i]` with `start[i], ..., start[i] + count[i] - 1`."""
+    offsets = np.cumsum(count) - count
+    total = count.sum()
+    t = np.repeat(t, count)
+    j = np.repeat(start - offsets, count) + np.arange(total)
+    return t, j
+
+
+def field(r, s, θ=0.5, leaf_size=8, softening=0):
+    """Barnes–Hut version of `jim_array.inverse_square_field`."""
+    return Tree(r, s, leaf_size).field(θ, softening)
+
+
+def exact_field(r, s, targets, softening=0):
+    """Exact field at the bodies `targets`, by direct summation."""
+    d = r[np.newaxis, :, :] - r[targets, np.newaxis, :]
+    distance_squared = np.einsum("ijk,ijk->ij", d, d) + softening ** 2
+    distance_squared[np.arange(len(targets)), targets] = np.inf
+    return np.einsum("ij,ijk->ik", s / distance_squared ** 1.5, d)
+
+
+def force_error(r, s, θ=0.5, leaf_size=8, softening=0, sample=1000,
+                seed=0):
+    """Compare the Barnes–Hut field with the exact one.
+
+    The exact field is only computed for `sample` randomly chosen
+    bodies. The errors are relative to the RMS of the exact field, so
+    they stay meaningful where the field of mixed charges cancels.
+    Returns a dict with the RMS and the maximum error.
+    """
+    r = np.asarray(r, dtype=float)
+    s = np.asarray(s, dtype=float)
+    rng = np.random.default_rng(seed)
+    targets = np.sort(rng.choice(len(r), min(sample, len(r)), replace=False))
+    approximate = field(r, s, θ, leaf_size, softening)[targets]
+    exact = exact_field(r, s, targets, softening)
+    scale = np.sqrt(np.mean(np.einsum("ij,ij->i", exact, exact)))
+    error = np.linalg.norm(approximate - exact, axis=1) / scale
+    return {
+        "θ": θ,
+        "rms": float(np.sqrt(np.mean(error ** 2))),
+        "max": float(error.max()),
+    }
@@ -0,0 +1,309 @@
+"""Benchmarks for `jim`, written to JSON for comparisons across commits.
+
+    python bench_jim.py --output results.json
+    python bench_jim.py --quick --filter pair_force
+    python bench_jim.py --compare old.json --output new.json
+
+Every benchmark is timed with `timeit` (the best and the median of
+`--repeat` runs of as many iterations as fit into about 0.2 s) and the
+scaling benchmarks are run for growing N until one run takes longer
+than `--max-seconds`.
+"""
+
+import argparse
+import datetime
+import json
+import math
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import timeit
+
+import jim
+from jim import (
+    Body, BoxMixin, RadioactiveBody, RadioactivityMixin, Universe, Vector,
+    coulomb_force, gravitate, implement_universal_force,
+)
+
+
+SIZES = (10, 30, 100, 300, 1000, 3000, 10000)
+QUICK_SIZES = (10, 30, 100)
+
+
+def measure(function, repeat):
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    times = [t / number for t in timer.repeat(repeat, number)]
+    return {
+        "number": number,
+        "best": min(times),
+        "median": statistics.median(times),
+    }
+
+
+def bench_vector(repeat, sizes, max_seconds):
+    a = Vector(1.0, 2.0, 3.0)
+    b = Vector(0.5, -1.0, 2.0)
+    cases = {
+        "add": lambda: a + b,
+        "scale": lambda: a * 0.5,
+        "dot": lambda: a * b,
+        "cross": lambda: a @ b,
+        "norm": lambda: a.norm,
+        "add_scaled": lambda: a.add_scaled(b, 0.1),
+    }
+    for name, function in cases.items():
+        yield {"name": "vector_" + name}, measure(function, repeat)
+
+
+def bench_body_a(repeat, sizes, max_seconds):
+    body = Body(Vector(1, 0, 0), Vector(0, 1, 0), lambda body: -body.r, 1)
+    body.add_force(jim.friction)
+
+    def evaluate():
+        body._a = None
+        return body.a
+
+    yield {"name": "body_a"}, measure(evaluate, repeat)
+
+
+def make_charged_universe(n, seed=0):
+    random.seed(seed)
+    universe = Universe(Vector(0, 0, 0))
+    for _ in range(n):
+        body = Body(jim.random_vector(10), jim.random_vector(1), None, 1)
+        body.q = 1e-6
+        universe.add(body)
+    return universe
+
+
+def bench_pair_force(repeat, sizes, max_seconds):
+    for force in (gravitate, coulomb_force):
+        for n in sizes:
+            universe = make_charged_universe(n)
+            implement_universal_force(universe, force)
+
+            def evaluate():
+                universe.epoch += 1
+                universe.compute_accelerations()
+
+            result = measure(evaluate, repeat)
+            result["pairs_per_second"] = n * (n - 1) / 2 / result["best"]
+            yield {"name": "pair_force", "force": force.__name__, "n": n}, \
+                result
+            if result["best"] > max_seconds:
+                break
+
+
+def bench_integrators(repeat, sizes, max_seconds):
+    integrators = dict(jim.INTEGRATORS)
+    integrators["block_timesteps"] = jim.BlockTimesteps(levels=3)
+    for name, integrator in integrators.items():
+        for n in sizes:
+            universe = make_charged_universe(n)
+            universe.integrator = integrator
+            implement_universal_force(universe, gravitate)
+            result = measure(lambda: universe.step(1e-3), repeat)
+            yield {"name": "integrator_step", "integrator": name, "n": n}, \
+                result
+            if result["best"] > max_seconds:
+                break
+
+
+def bench_array_universe(repeat, sizes, max_seconds):
+    try:
+        import jim_array
+    except ImportError:
+        return
+    for n in sizes:
+        universe = jim_array.ArrayUniverse(Vector(0, 0, 0))
+        universe.add_all(make_charged_universe(n).bodies)
+        jim_array.implement_batched_force(universe, gravitate)
+        universe.add_force(jim_array.array_friction)
+        result = measure(lambda: universe.step(1e-3), repeat)
+        yield {"name": "array_universe_step", "n": n}, result
+        if result["best"] > max_seconds:
+            break
+
+
+def bench_pair_field(repeat, sizes, max_seconds):
+    """The inverse square field behind `gravitate` and `coulomb_force`,
+    exactly and with Barnes–Hut."""
+    try:
+        import numpy as np
+        import barnes_hut
+    except ImportError:
+        return
+    methods = {
+        "exact": jim.inverse_square_field,
+        "barnes-hut": barnes_hut.field,
+    }
+    for method, field in methods.items():
+        for n in sizes:
+            rng = np.random.default_rng(0)
+            r = rng.uniform(-10, 10, (n, 3))
+            s = rng.uniform(1, 2, n)
+            result = measure(lambda: field(r, s), repeat)
+            result["pairs_per_second"] = n * (n - 1) / 2 / result["best"]
+            yield {"name": "pair_field", "method": method, "n": n}, result
+            if result["best"] > max_seconds:
+                break
+
+
+def bench_box_decay_step(repeat, sizes, max_seconds):
+    class DecayUniverse(BoxMixin, RadioactivityMixin, Universe):
+        pass
+
+    dt = 0.01
+
+    def nucleus():
+        # About one percent of the bodies decays in every step.
+        return RadioactiveBody(1, jim.random_vector(4, 2),
+                               jim.random_vector(1, 2), None, 1)
+
+    for n in sizes:
+        random.seed(0)
+        universe = DecayUniverse(size=5, gravity=Vector(0, -1))
+        universe.add_all(nucleus() for _ in range(n))
+        # Acts on the bodies that replace the decayed ones, too.
+        universe.add_force(jim.Field(jim.friction))
+
+        def step():
+            universe.step(dt)
+            universe.time += dt
+            # Replace the decayed bodies, so that every step decays
+            # about as many bodies.
+            for _ in range(n - len(universe.bodies)):
+                universe.add(nucleus())
+
+        result = measure(step, repeat)
+        yield {"name": "box_decay_step", "n": n}, result
+        if result["best"] > max_seconds:
+            break
+
+
+def let_decay(n, dt=0.005, λ=math.log(2) / 20):
+    """`let_decay` from `test_decay.ipynb`: one random number per
+    nucleus and step."""
+    decayed = 0
+    elapsed = 0
+    while decayed < n / 2:
+        elapsed += dt
+        for _ in range(n - decayed):
+            decayed += random.random() > math.exp(-λ * dt)
+    return decayed, elapsed
+
+
+def bench_decay(repeat, sizes, max_seconds):
+    random.seed(0)
+    for n in sizes:
+        result = measure(lambda: let_decay(n), repeat)
+        yield {"name": "let_decay", "n": n}, result
+        if result["best"] > max_seconds:
+            break
+    try:
+        from decay_chain import DecayChain
+    except ImportError:
+        return
+    for n in sizes:
+        def run():
+            chain = DecayChain([math.log(2) / 20], [n], seed=0)
+            while chain.counts[0] > n / 2:
+                chain.step(0.005)
+        yield {"name": "decay_chain", "n": n}, measure(run, repeat)
+
+
+BENCHMARKS = {
+    "vector": bench_vector,
+    "body_a": bench_body_a,
+    "pair_force": bench_pair_force,
+    "integrators": bench_integrators,
+    "array_universe": bench_array_universe,
+    "pair_field": bench_pair_field,
+    "box_decay_step": bench_box_decay_step,
+    "decay": bench_decay,
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(names=None, quick=False, repeat=5, max_seconds=1.0, log=None):
+    sizes = QUICK_SIZES if quick else SIZES
+    results = []
+    for name, benchmark in BENCHMARKS.items():
+        if names and not any(selected in name for selected in names):
+            continue
+        for parameters, result in benchmark(repeat, sizes, max_seconds):
+            result = dict(parameters, **result)
+            results.append(result)
+            if log is not None:
+                print(json.dumps(result), file=log)
+    return {
+        "commit": git_commit(),
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": sys.version,
+        "platform": platform.platform(),
+        "quick": quick,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def key(result):
+    return tuple(sorted(
+        (name, value) for name, value in result.items()
+        if name in ("name", "force", "integrator", "method", "n")
+    ))
+
+
+def compare(old, new):
+    """Lines with the ratio of the best times of every benchmark that is
+    in both reports (> 1 means `new` is slower).
+    """
+    old_results = {key(result): result for result in old["results"]}
+    lines = []
+    for result in new["results"]:
+        previous = old_results.get(key(result))
+        if previous is None:
+            continue
+        lines.append("{:<50} {:8.3f}".format(
+            " ".join("{}={}".format(*item) for item in key(result)),
+            result["best"] / previous["best"],
+        ))
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--output", "-o", default="bench_results.json")
+    parser.add_argument("--filter", "-k", action="append",
+                        help="only run benchmarks containing this name")
+    parser.add_argument("--quick", action="store_true",
+                        help="only small N, e. g. for CI")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=1.0,
+                        help="stop growing N after a run this long")
+    parser.add_argument("--compare",
+                        help="print time ratios against this earlier report")
+    args = parser.parse_args(argv)
+    report = run(args.filter, args.quick, args.repeat, args.max_seconds,
+                 log=sys.stderr)
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            print("\n".join(compare(json.load(file), report)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Uniform grid cell lists and Verlet neighbour lists.
+
+The box `[-size, size]^dimension` (see `jim.BoxMixin`) is divided into
+cells that are at least as wide as the interaction range, so every pair
+closer than that range lies in the same or in adjacent cells. Only the
+half shell of neighbouring cells is searched, which yields each pair
+exactly once.
+"""
+
+from itertools import product
+
+import numpy as np
+
+from barnes_hut import expand
+
+
+class CellList(object):
+    def __init__(self, size, width, dimension):
+        self.size = size
+        self.dimension = dimension
+        self.cells_per_axis = max(1, int(2 * size // width))
+        self.width = 2 * size / self.cells_per_axis
+        offsets = [
+            offset for offset in product((-1, 0, 1), repeat=dimension)
+            if offset > (0,) * dimension
+        ]
+        self.offsets = np.array(offsets, dtype=np.int64)
+
+    def cells(self, r):
+        # Bodies slightly outside of the box (before `check_box` turns
+        # them around) are put into the outermost cells.
+        cells = np.floor((r + self.size) / self.width).astype(np.int64)
+        return np.clip(cells, 0, self.cells_per_axis - 1)
+
+    def candidate_pairs(self, r):
+        """All pairs `i, j` in the same or in adjacent cells."""
+        shape = (self.cells_per_axis,) * self.dimension
+        cells = self.cells(r)
+        flat = np.ravel_multi_index(cells.T, shape)
+        order = np.argsort(flat, kind="stable")
+        count = np.bincount(flat, minlength=np.prod(shape))
+        start = np.cumsum(count) - count
+
+        # Pairs within the same cell: only `j` after `i` in `order`.
+        position = np.empty_like(order)
+        position[order] = np.arange(len(order))
+        after = position + 1
+        i, k = expand(
+            np.arange(len(r)), after, start[flat] + count[flat] - after
+        )
+        pairs_i, pairs_j = [i], [order[k]]
+
+        for offset in self.offsets:
+            neighbour = cells + offset
+            inside = np.all(
+                (neighbour >= 0) & (neighbour < self.cells_per_axis), axis=1
+            )
+            body = np.flatnonzero(inside)
+            neighbour_flat = np.ravel_multi_index(neighbour[inside].T, shape)
+            i, k = expand(
+                body, start[neighbour_flat], count[neighbour_flat]
+            )
+            pairs_i.append(i)
+            pairs_j.append(order[k])
+        return np.concatenate(pairs_i), np.concatenate(pairs_j)
+
+    def pairs(self, r, radius):
+        i, j = self.candidate_pairs(r)
+        d = r[j] - r[i]
+        close = np.einsum("ij,ij->i", d, d) < radius ** 2
+        return i[close], j[close]
+
+
+class NeighbourList(object):
+    """Verlet list of all pairs closer than `cutoff + skin`.
+
+    The list is only rebuilt from a fresh `CellList` when a body moved
+    further than `skin / 2` since the last build or when bodies were
+    added or removed.
+    """
+
+    def __init__(self, cutoff, skin=None):
+        self.cutoff = cutoff
+        self.skin = 0.1 * cutoff if skin is None else skin
+        self.reference = None
+        self.rebuilds = 0
+
+    def needs_rebuild(self, r):
+        if self.reference is None or len(self.reference) != len(r):
+            return True
+        displacement = np.einsum(
+            "ij,ij->i", r - self.reference, r - self.reference
+        )
+        return displacement.max(initial=0) > (self.skin / 2) ** 2
+
+    def pairs(self, r, size=None):
+        if self.needs_rebuild(r):
+            if size is None:
+                size = np.abs(r).max(initial=0) + self.cutoff
+            radius = self.cutoff + self.skin
+            self.cells = CellList(size, radius, r.shape[1])
+            self.i, self.j = self.cells.pairs(r, radius)
+            self.reference = r.copy()
+            self.rebuilds += 1
+        return self.i, self.j
@@ -0,0 +1,392 @@
+"""Event-driven hard-sphere collisions.
+
+Between collisions every disc (or ball) flies in a straight line, so the
+time of the next collision of a pair and of a disc with a wall of the
+box `[-size, size]^dimension` can be computed exactly. The events are
+kept in a priority queue and processed in order of their times; events
+that involve a disc that collided since they were predicted are stale
+and skipped (every disc has a counter of its events for that).
+
+Only discs in the same or in adjacent cells of a `CellList` can collide
+before one of them leaves its cell, so leaving a cell is an event, too,
+and new collisions are only predicted with the discs in the cells
+around a disc. Positions are only brought up to date for the discs
+taking part in an event; each disc carries the time `t` its position
+refers to.
+"""
+
+import heapq
+import math
+from itertools import product
+
+import numpy as np
+
+import jim
+from cell_list import CellList
+
+
+WALL, CELL, PAIR = range(3)
+
+
+def collision_times(dr, dv, σ):
+    """Time until discs at distance `dr` with relative velocity `dv`
+    touch (`np.inf` if they never do). Overlapping discs that approach
+    each other collide immediately.
+    """
+    b = np.einsum("ij,ij->i", dr, dv)
+    vv = np.einsum("ij,ij->i", dv, dv)
+    c = np.einsum("ij,ij->i", dr, dr) - σ ** 2
+    discriminant = b * b - vv * c
+    with np.errstate(divide="ignore", invalid="ignore"):
+        τ = (-b - np.sqrt(discriminant)) / vv
+    return np.where((b < 0) & (discriminant > 0), np.maximum(τ, 0), np.inf)
+
+
+def crossing_times(x, v, lower, upper):
+    """Time until `x` moving with `v` leaves `[lower, upper]` on every
+    axis, and whether it leaves through `upper`.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        τ = np.where(
+            v > 0, (upper - x) / v, np.where(v < 0, (lower - x) / v, np.inf)
+        )
+    return np.maximum(τ, 0), v > 0
+
+
+class HardSpheres(object):
+    def __init__(self, r, v, radius, m, size, restitution=1, time=0):
+        self.r = np.array(r, dtype=float)
+        self.v = np.array(v, dtype=float)
+        number, self.dimension = self.r.shape
+        self.radius = np.broadcast_to(radius, (number,)).astype(float)
+        self.m = np.broadcast_to(m, (number,)).astype(float)
+        self.size = size
+        self.restitution = restitution
+        self.time = time
+        self.t = np.full(number, float(time))
+        self.collisions = self.wall_hits = self.crossings = 0
+
+        # Cells must be wide enough for touching discs to be neighbours;
+        # wider cells than about one disc per cell only make the pair
+        # predictions more expensive, narrower ones the crossings more
+        # frequent.
+        self.cells = CellList(
+            size,
+            max(2 * self.radius.max(initial=0),
+                2 * size / max(number, 1) ** (1 / self.dimension)),
+            self.dimension,
+        )
+        self.shape = (self.cells.cells_per_axis,) * self.dimension
+        self.neighbourhood = np.array(
+            list(product((-1, 0, 1), repeat=self.dimension))
+        )
+        self.strides = [
+            self.cells.cells_per_axis ** k
+            for k in reversed(range(self.dimension))
+        ]
+        self.adjacent = {}
+        cell = self.cells.cells(self.r)
+        self._flat_cell = self._flat(cell)
+        self.members = {}
+        for i, flat in enumerate(self._flat_cell):
+            self.members.setdefault(flat, set()).add(i)
+        self._predict_all(cell)
+
+        # The event loop works on Python lists: indexing single elements
+        # of NumPy arrays is much slower.
+        self._r = self.r.tolist()
+        self._v = self.v.tolist()
+        self._t = self.t.tolist()
+        self._radius = self.radius.tolist()
+        self._m = self.m.tolist()
+        self._cell = cell.tolist()
+        self._counts = [0] * number
+
+    def _flat(self, cells):
+        return np.ravel_multi_index(cells.T, self.shape).tolist()
+
+    def _neighbour_cells(self, flat):
+        if flat not in self.adjacent:
+            cell = np.unravel_index(flat, self.shape)
+            neighbours = np.array(cell) + self.neighbourhood
+            inside = np.all(
+                (neighbours >= 0) & (neighbours < self.cells.cells_per_axis),
+                axis=1,
+            )
+            self.adjacent[flat] = self._flat(neighbours[inside])
+        return self.adjacent[flat]
+
+    def _predict_all(self, cell):
+        """Predict the first events of all discs at once."""
+        self.events = []
+        everyone = np.arange(len(self.r))
+        none = np.full(len(self.r), -1)
+        zeros = np.zeros(len(self.r), dtype=np.int64)
+
+        walls = self.size - self.radius[:, None]
+        τ, _ = crossing_times(self.r, self.v, -walls, walls)
+        axis = τ.argmin(axis=1)
+        self._push(self.t + τ[everyone, axis], WALL, everyone, axis, none)
+
+        lower = -self.size + cell * self.cells.width
+        upper = lower + self.cells.width
+        # Discs cannot leave the outermost cells through the walls.
+        lower = np.where(cell == 0, -np.inf, lower)
+        upper = np.where(cell == self.cells.cells_per_axis - 1, np.inf, upper)
+        τ, up = crossing_times(self.r, self.v, lower, upper)
+        axis = τ.argmin(axis=1)
+        self._push(
+            self.t + τ[everyone, axis], CELL, everyone,
+            2 * axis + up[everyone, axis], none,
+        )
+
+        i, j = self.cells.candidate_pairs(self.r)
+        τ = collision_times(
+            self.r[j] - self.r[i], self.v[j] - self.v[i],
+            self.radius[i] + self.radius[j],
+        )
+        self._push(self.t[i] + τ, PAIR, i, j, zeros[j])
+        heapq.heapify(self.events)
+
+    def _push(self, times, kind, i, other, counts_other):
+        finite = np.isfinite(times)
+        self.events.extend(zip(
+            times[finite].tolist(),
+            [kind] * int(finite.sum()),
+            i[finite].tolist(),
+            other[finite].tolist(),
+            [0] * int(finite.sum()),
+            counts_other[finite].tolist(),
+        ))
+
+    def _predict(self, i):
+        r, v, t = self._r[i], self._v[i], self._t[i]
+        count = self._counts[i]
+        events = self.events
+
+        wall = self.size - self._radius[i]
+        first, axis = math.inf, -1
+        for k, (x, u) in enumerate(zip(r, v)):
+            if u:
+                τ = ((wall if u > 0 else -wall) - x) / u
+                if τ < first:
+                    first, axis = τ, k
+        if axis >= 0:
+            heapq.heappush(events, (t + max(first, 0), WALL, i, axis, count, -1))
+
+        width = self.cells.width
+        last = self.cells.cells_per_axis - 1
+        first, direction = math.inf, -1
+        for k, (x, u, c) in enumerate(zip(r, v, self._cell[i])):
+            if u > 0 and c < last:
+                τ = (-self.size + (c + 1) * width - x) / u
+                if τ < first:
+                    first, direction = τ, 2 * k + 1
+            elif u < 0 and c > 0:
+                τ = (-self.size + c * width - x) / u
+                if τ < first:
+                    first, direction = τ, 2 * k
+        if direction >= 0:
+            heapq.heappush(
+                events, (t + max(first, 0), CELL, i, direction, count, -1)
+            )
+
+        radius = self._radius[i]
+        for flat in self._neighbour_cells(self._flat_cell[i]):
+            for j in self.members.get(flat, ()):
+                if j == i:
+                    continue
+                t_j = self._t[j]
+                now = t if t > t_j else t_j
+                b = vv = c = 0
+                for x, u, y, w in zip(r, v, self._r[j], self._v[j]):
+                    d = y + w * (now - t_j) - x - u * (now - t)
+                    dv = w - u
+                    b += d * dv
+                    vv += dv * dv
+                    c += d * d
+                if b >= 0:
+                    continue
+                σ = radius + self._radius[j]
+                discriminant = b * b - vv * (c - σ * σ)
+                if discriminant <= 0:
+                    continue
+                τ = (-b - math.sqrt(discriminant)) / vv
+                heapq.heappush(events, (
+                    now + max(τ, 0), PAIR, i, j, count, self._counts[j]
+                ))
+
+    def _move(self, i, time):
+        dt = time - self._t[i]
+        self._r[i] = [x + u * dt for x, u in zip(self._r[i], self._v[i])]
+        self._t[i] = time
+
+    def advance(self, end_time):
+        """Process all events up to `end_time` and move every disc
+        there.
+        """
+        events = self.events
+        counts = self._counts
+        while events and events[0][0] <= end_time:
+            time, kind, i, other, count, count_other = heapq.heappop(events)
+            if counts[i] != count:
+                continue
+            if kind == PAIR:
+                if counts[other] != count_other:
+                    continue
+                self._collide(i, other, time)
+                counts[i] += 1
+                counts[other] += 1
+                self._predict(i)
+                self._predict(other)
+                continue
+            elif kind == WALL:
+                self._move(i, time)
+                self._v[i][other] *= -1
+                self.wall_hits += 1
+            else:
+                self._cross(i, time, other)
+            counts[i] += 1
+            self._predict(i)
+        self.r = np.array(self._r).reshape(self.r.shape)
+        self.v = np.array(self._v).reshape(self.v.shape)
+        self.t = np.array(self._t)
+        self.r += self.v * (end_time - self.t)[:, None]
+        self.t[:] = end_time
+        self._r = self.r.tolist()
+        self._t = self.t.tolist()
+        self.time = end_time
+
+    def update(self, i, r, v):
+        """Set the position and velocity of disc `i` at `self.time`
+        after they were changed outside of the event loop, and predict
+        its events again.
+        """
+        self._r[i] = list(r)
+        self._v[i] = list(v)
+        self._t[i] = self.time
+        # Makes the events predicted with the old motion stale.
+        self._counts[i] += 1
+        cell = self.cells.cells(np.array([self._r[i]]))
+        flat = self._flat(cell)[0]
+        if flat != self._flat_cell[i]:
+            self.members[self._flat_cell[i]].discard(i)
+            self.members.setdefault(flat, set()).add(i)
+            self._flat_cell[i] = flat
+        self._cell[i] = cell[0].tolist()
+        self._predict(i)
+
+    def _collide(self, i, j, time):
+        self._move(i, time)
+        self._move(j, time)
+        n = [y - x for x, y in zip(self._r[i], self._r[j])]
+        length = math.sqrt(sum(x * x for x in n))
+        approach = sum(
+            (w - u) * x for u, w, x in zip(self._v[i], self._v[j], n)
+        ) / length
+        impulse = (
+            (1 + self.restitution) * approach
+            / (1 / self._m[i] + 1 / self._m[j]) / length
+        )
+        self._v[i] = [
+            u + impulse / self._m[i] * x for u, x in zip(self._v[i], n)
+        ]
+        self._v[j] = [
+            w - impulse / self._m[j] * x for w, x in zip(self._v[j], n)
+        ]
+        self.collisions += 1
+
+    def _cross(self, i, time, direction):
+        self._move(i, time)
+        axis, up = divmod(direction, 2)
+        step = 1 if up else -1
+        self._cell[i][axis] += step
+        self.members[self._flat_cell[i]].discard(i)
+        self._flat_cell[i] += step * self.strides[axis]
+        self.members.setdefault(self._flat_cell[i], set()).add(i)
+        self.crossings += 1
+
+
+class HardSphereCollisions(object):
+    """Integrator for `Universe(..., integrator=HardSphereCollisions())`
+    in a box universe (`jim.BoxMixin`) of `jim.Circle`s.
+
+    The forces are applied as a kick at the start of the step, then the
+    bodies fly freely for `dt` and collide with each other and with the
+    walls at `±(size - radius)`. Bodies without a `radius` are points.
+    `restitution` is the ratio of the relative normal speeds after and
+    before a collision (1 for elastic collisions); walls are elastic.
+
+    The `HardSpheres` engine is kept from step to step, so its event
+    queue is only predicted again for the bodies that were changed
+    outside of it; it is rebuilt when bodies were added or removed.
+    """
+
+    def __init__(self, restitution=1):
+        self.restitution = restitution
+        self.collisions = self.wall_hits = 0
+        # The engine of the last step and the bodies it was built for.
+        self.spheres = None
+        self.bodies = []
+        self.rebuilds = 0
+
+    def _engine(self, universe, bodies):
+        """The engine of the last step with the bodies whose position
+        or velocity changed since (by forces, `check_box`, ...) updated,
+        or a new one if the bodies changed.
+        """
+        spheres = self.spheres
+        radius = [float(getattr(body, "radius", 0)) for body in bodies]
+        m = [float(body.m) for body in bodies]
+        if (
+                spheres is not None
+                and spheres.time == universe.time
+                and spheres.size == universe.size
+                and len(bodies) == len(self.bodies)
+                and all(a is b for a, b in zip(bodies, self.bodies))
+                and radius == spheres._radius
+                and m == spheres._m):
+            changed = [
+                (i, list(body.r), list(body.v))
+                for i, body in enumerate(bodies)
+                if list(body.r) != spheres._r[i]
+                or list(body.v) != spheres._v[i]
+            ]
+            # Predicting the discs one by one is slower than predicting
+            # all of them at once when most of them changed (e. g. when
+            # all bodies are kicked by gravity).
+            if len(changed) <= len(bodies) // 2:
+                for i, r, v in changed:
+                    spheres.update(i, r, v)
+                return spheres
+        self.spheres = HardSpheres(
+            [tuple(body.r) for body in bodies],
+            [tuple(body.v) for body in bodies],
+            radius,
+            m,
+            universe.size,
+            self.restitution,
+            universe.time,
+        )
+        self.bodies = bodies
+        self.rebuilds += 1
+        return self.spheres
+
+    def __call__(self, universe, dt):
+        if not hasattr(universe, "size"):
+            raise ValueError("hard-sphere collisions need a box universe")
+        universe.kick(dt)
+        bodies = universe.integrated_bodies(order=2)
+        if bodies:
+            spheres = self._engine(universe, bodies)
+            collisions, wall_hits = spheres.collisions, spheres.wall_hits
+            spheres.advance(universe.time + dt)
+            for body, r, v in zip(
+                    bodies, spheres.r.tolist(), spheres.v.tolist()):
+                body.r = jim.Vector(*r)
+                body.v = jim.Vector(*v)
+            self.collisions += spheres.collisions - collisions
+            self.wall_hits += spheres.wall_hits - wall_hits
+        for body in universe.integrated_bodies():
+            if getattr(body, "order", 1) == 1:
+                body.r = body.r.add_scaled(body.v, dt)
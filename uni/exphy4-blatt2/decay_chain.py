@@ -0,0 +1,112 @@
+"""Decay chains on the level of populations.
+
+Instead of one `RadioactiveBody` per nucleus, only the number of nuclei
+of every nuclide in a chain `0 → 1 → … → n - 1` is tracked. A step of
+length `dt` draws the number of decays of every nuclide from a binomial
+distribution, so the cost does not depend on the number of nuclei.
+Daughters created during a step only start decaying in the next one,
+which is exact for a single nuclide and otherwise an error of order
+`λ dt`. `DecayChain.gillespie` simulates every single decay instead and
+is exact, but only feasible for small populations.
+"""
+
+import math
+
+import numpy as np
+
+
+class DecayChain(object):
+    def __init__(self, λ, counts, start_time=0, seed=None):
+        """`λ[i]` is the decay constant of nuclide `i` (0 for the stable
+        end of the chain), `counts[i]` the initial number of nuclei.
+        """
+        self.λ = np.asarray(λ, dtype=float)
+        self.counts = np.asarray(counts, dtype=np.int64).copy()
+        if self.λ.shape != self.counts.shape:
+            raise ValueError("need one decay constant per nuclide")
+        if self.λ[-1] != 0:
+            # Decays of the last nuclide leave the chain.
+            self.λ = np.append(self.λ, 0)
+            self.counts = np.append(self.counts, 0)
+        self.time = start_time
+        self.rng = np.random.default_rng(seed)
+
+    def step(self, dt):
+        decays = self.rng.binomial(self.counts, -np.expm1(-self.λ * dt))
+        self.counts -= decays
+        self.counts[1:] += decays[:-1]
+        self.time += dt
+
+    def simulate(self, end_time, dt):
+        """Yield `(time, counts)` every `dt`, like `Universe.simulate`."""
+        yield self.time, self.counts.copy()
+        for _ in range(int(end_time // dt)):
+            self.step(dt)
+            yield self.time, self.counts.copy()
+
+    def gillespie(self, end_time, dt):
+        """Exact stochastic simulation of every single decay. Yields the
+        counts every `dt`.
+        """
+        outputs = self.time + dt * np.arange(int(end_time // dt) + 1)
+        outputs = iter(outputs.tolist())
+        output_time = next(outputs)
+        while True:
+            rates = self.λ * self.counts
+            total = rates.sum()
+            event_time = (
+                self.time + self.rng.exponential(1 / total)
+                if total > 0 else math.inf
+            )
+            while output_time < event_time:
+                self.time = output_time
+                yield output_time, self.counts.copy()
+                output_time = next(outputs, None)
+                if output_time is None:
+                    return
+            self.time = event_time
+            nuclide = np.searchsorted(
+                np.cumsum(rates), self.rng.random() * total, "right"
+            )
+            self.counts[nuclide] -= 1
+            self.counts[nuclide + 1] += 1
+
+
+def bateman(λ, counts, t):
+    """Expected counts of every nuclide at the times `t` (analytic
+    solution of the Bateman equations). All decay constants have to be
+    distinct.
+    """
+    λ = np.asarray(λ, dtype=float)
+    counts = np.asarray(counts, dtype=float)
+    if λ[-1] != 0:
+        λ = np.append(λ, 0)
+        counts = np.append(counts, 0)
+    if len(np.unique(λ)) != len(λ):
+        raise ValueError("the decay constants have to be distinct")
+    t = np.asarray(t, dtype=float)
+    result = np.zeros(t.shape + λ.shape)
+    for start, count in enumerate(counts):
+        for n in range(start, len(λ)):
+            chain = λ[start:n + 1]
+            factor = count * np.prod(chain[:-1])
+            for j, λ_j in enumerate(chain):
+                others = np.delete(chain, j)
+                result[..., n] += (
+                    factor * np.exp(-λ_j * t) / np.prod(others - λ_j)
+                )
+    return result
+
+
+def half_life(times, counts):
+    """Estimate the half-life from the numbers of remaining nuclei
+    `counts` at `times` by a weighted fit of `log(counts)`.
+    """
+    times = np.asarray(times, dtype=float)
+    counts = np.asarray(counts, dtype=float)
+    alive = counts > 0
+    # The variance of `log(N)` is about `1 / N`.
+    slope, _ = np.polyfit(
+        times[alive], np.log(counts[alive]), 1, w=np.sqrt(counts[alive])
+    )
+    return math.log(2) / -slope
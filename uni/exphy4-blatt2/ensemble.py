@@ -0,0 +1,125 @@
+"""Run ensembles of independent universes on all cores.
+
+A member of an ensemble is built by a factory from one point of a
+parameter grid and a seed, simulated and reduced to a small result in
+a worker process. Only the reduced results travel back to the parent,
+never whole trajectories.
+
+The factory and the reducer are sent to the workers, so they have to be
+picklable: module level functions, `functools.partial` objects or
+instances of the reducers below.
+"""
+
+import hashlib
+import multiprocessing
+import os
+import random
+from itertools import product
+
+import jim
+
+
+def parameter_grid(**axes):
+    """All combinations of the given values, as a list of dicts.
+
+    >>> parameter_grid(n=[1, 2], size=[5])
+    [{'n': 1, 'size': 5}, {'n': 2, 'size': 5}]
+    """
+    names = list(axes)
+    return [
+        dict(zip(names, values))
+        for values in product(*(axes[name] for name in names))
+    ]
+
+
+def member_seed(seed, index):
+    """Seed of member `index`, independent of the number of processes."""
+    digest = hashlib.sha256("{}:{}".format(seed, index).encode()).digest()
+    return int.from_bytes(digest[:8], "little")
+
+
+def run_member(job):
+    factory, reduce, index, parameters, seed = job
+    random.seed(seed)
+    universe = factory(seed=seed, **parameters)
+    return index, parameters, reduce(universe)
+
+
+def run_ensemble(
+        factory, grid, reduce, repetitions=1, processes=None, seed=0,
+        ordered=False):
+    """Simulate every point of `grid` `repetitions` times.
+
+    `factory(seed=..., **parameters)` returns a universe; `random` is
+    seeded with the same seed before it is called. `reduce(universe)`
+    runs the simulation and returns the result. Yields `(index,
+    parameters, result)` as the members finish (in order of `index`
+    with `ordered=True`). With `processes=1` everything runs in this
+    process.
+    """
+    jobs = [
+        (factory, reduce, index, parameters, member_seed(seed, index))
+        for index, parameters in enumerate(
+            parameters
+            for parameters in grid
+            for _ in range(repetitions)
+        )
+    ]
+    if processes == 1:
+        yield from map(run_member, jobs)
+        return
+    with multiprocessing.Pool(processes) as pool:
+        imap = pool.imap if ordered else pool.imap_unordered
+        chunksize = max(1, len(jobs) // (4 * (processes or os.cpu_count())))
+        yield from imap(run_member, jobs, chunksize)
+
+
+class FinalState(object):
+    """Simulate and return the final positions and velocities."""
+
+    def __init__(self, end_time, dt, steplen=None):
+        self.end_time = end_time
+        self.dt = dt
+        self.steplen = steplen
+
+    def simulate(self, universe):
+        if self.steplen is None:
+            jim.exhaust(universe.simulate(self.end_time, self.dt))
+        else:
+            jim.exhaust(universe.simulate_shortstep(
+                self.end_time, self.dt, self.steplen
+            ))
+
+    def __call__(self, universe):
+        self.simulate(universe)
+        return [(tuple(body.r), tuple(body.v)) for body in universe]
+
+
+class EnergyCurve(FinalState):
+    """Simulate and return the kinetic energy every `dt`."""
+
+    def __call__(self, universe):
+        if self.steplen is None:
+            states = universe.simulate(self.end_time, self.dt)
+        else:
+            states = universe.simulate_shortstep(
+                self.end_time, self.dt, self.steplen
+            )
+        return [jim.kinetic_energy(state) for state in states]
+
+
+class BodyCount(FinalState):
+    """Simulate and return the number of bodies every `dt`, e. g. the
+    number of nuclei that have not decayed yet.
+    """
+
+    def __call__(self, universe):
+        counts = [len(universe.bodies)]
+        for _ in range(int(self.end_time // self.dt)):
+            if self.steplen is None:
+                universe.step(self.dt)
+                universe.time += self.dt
+            else:
+                jim.exhaust(universe.simulate(self.dt, self.steplen))
+            counts.append(len(universe.bodies))
+        return counts
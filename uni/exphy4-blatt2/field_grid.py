@@ -0,0 +1,286 @@
+"""Static fields sampled once on a lattice and interpolated.
+
+Fields like `circular_field` in `Krümmungsdrift.ipynb` are Python
+functions of a single `Vector` and are called for every body on every
+step. A `FieldGrid` evaluates such a field once on a regular lattice
+(optionally cached in a `.npy` file that is memory-mapped on later
+runs) and interpolates it for many positions at once, trilinearly
+(`order=1`) or tricubically (`order=3`, from the 4³ surrounding
+points, with the stencil shifted inwards at the edges). Outside of the
+lattice the field is extrapolated from the outermost cells.
+
+A cache file `field.npy` comes with `field.npy.json`, which records the
+bounds of the lattice. Before a cache is used, the bounds are compared
+and the field is evaluated again at a few lattice points, so that a
+cache of another lattice or of a changed field is not used by mistake.
+"""
+
+import json
+import math
+import os
+
+import numpy as np
+
+import jim
+
+
+def cubic_weights(t):
+    """Lagrange weights of the points `-1, 0, 1, 2` for the position
+    `t`."""
+    return (
+        -t * (t - 1) * (t - 2) / 6,
+        (t + 1) * (t - 1) * (t - 2) / 2,
+        -(t + 1) * t * (t - 2) / 2,
+        (t + 1) * t * (t - 1) / 6,
+    )
+
+
+class FieldGrid(object):
+    def __init__(self, values, lower, upper, order=1, parts=None):
+        """`values` has the shape of the lattice plus one axis for the
+        components. `parts` are the lengths of the vectors returned by
+        the original field, e. g. `(3, 3)` for `(E, B)`.
+        """
+        if order not in (1, 3):
+            raise ValueError("order must be 1 (trilinear) or 3 (tricubic)")
+        if order == 3 and min(values.shape[:-1]) < 4:
+            raise ValueError("tricubic interpolation needs 4 points per axis")
+        self.values = values
+        self.lower = np.asarray(lower, dtype=float)
+        self.upper = np.asarray(upper, dtype=float)
+        self.shape = np.array(values.shape[:-1])
+        self.dimension = len(self.shape)
+        self.spacing = (self.upper - self.lower) / (self.shape - 1)
+        self.order = order
+        self.parts = (values.shape[-1],) if parts is None else tuple(parts)
+        self._lower = self.lower.tolist()
+        self._spacing = self.spacing.tolist()
+        self._shape = self.shape.tolist()
+
+    @classmethod
+    def sample(cls, field, lower, upper, shape, order=1, path=None):
+        """Evaluate `field(r)` at every point of a lattice with `shape`
+        points between `lower` and `upper`. With `path`, the values are
+        stored in that file, or loaded from it if it exists.
+        """
+        lower = np.asarray(lower, dtype=float)
+        upper = np.asarray(upper, dtype=float)
+        shape = tuple(shape)
+        axes = [
+            np.linspace(low, high, n).tolist()
+            for low, high, n in zip(lower, upper, shape)
+        ]
+        checks = {
+            index: cls._flatten(
+                field(jim.Vector(*(axis[i] for axis, i in zip(axes, index))))
+            )
+            for index in cls._check_points(shape)
+        }
+        parts = next(iter(checks.values()))[1]
+        components = sum(parts)
+        bounds = {
+            "lower": lower.tolist(),
+            "upper": upper.tolist(),
+            "shape": list(shape),
+        }
+        if path is not None and os.path.exists(path):
+            values = np.load(path, mmap_mode="r")
+            if values.shape != shape + (components,):
+                raise ValueError(
+                    "{} has shape {}, expected {}".format(
+                        path, values.shape, shape + (components,)
+                    )
+                )
+            try:
+                with open(path + ".json") as file:
+                    cached_bounds = json.load(file)
+            except FileNotFoundError:
+                cached_bounds = None
+            if cached_bounds != bounds:
+                raise ValueError(
+                    "{} was sampled on the lattice {}, expected {}; "
+                    "delete it to sample again".format(
+                        path, cached_bounds, bounds
+                    )
+                )
+            for index, (expected, _) in checks.items():
+                if not np.allclose(values[index], expected):
+                    raise ValueError(
+                        "{} does not match the field at {}; delete it "
+                        "to sample again".format(path, index)
+                    )
+            return cls(values, lower, upper, order, parts)
+        if path is None:
+            values = np.empty(shape + (components,))
+        else:
+            values = np.lib.format.open_memmap(
+                path, mode="w+", shape=shape + (components,)
+            )
+        for index in np.ndindex(*shape):
+            r = jim.Vector(*(axis[i] for axis, i in zip(axes, index)))
+            values[index] = cls._flatten(field(r))[0]
+        if path is not None:
+            values.flush()
+            with open(path + ".json", "w") as file:
+                json.dump(bounds, file)
+        return cls(values, lower, upper, order, parts)
+
+    @staticmethod
+    def _check_points(shape):
+        """Lattice indices at which a cache is compared with the field:
+        both corners and the centre."""
+        return [
+            tuple(0 for _ in shape),
+            tuple(n // 2 for n in shape),
+            tuple(n - 1 for n in shape),
+        ]
+
+    @staticmethod
+    def _flatten(value):
+        if isinstance(value, jim.Vector):
+            return list(value), (len(value),)
+        xs = [x for vector in value for x in vector]
+        return xs, tuple(map(len, value))
+
+    def _stencil(self, points):
+        """First lattice index and weights of the interpolation stencil
+        of every point."""
+        x = (points - self.lower) / self.spacing
+        if self.order == 1:
+            base = np.clip(np.floor(x).astype(np.int64), 0, self.shape - 2)
+            t = x - base
+            return base, np.stack([1 - t, t], axis=-1)
+        base = np.clip(np.floor(x).astype(np.int64), 1, self.shape - 3)
+        return base - 1, np.stack(cubic_weights(x - base), axis=-1)
+
+    def interpolate(self, points):
+        """Interpolated field at `points` (one row per point), one row
+        of components per point.
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, self.dimension)
+        first, weights = self._stencil(points)
+        size = weights.shape[-1]
+        # Gather the whole stencil of every point with one index
+        # operation: every axis gets its own broadcasting axis.
+        index = []
+        weight = np.ones((len(points),) + (1,) * self.dimension)
+        for axis in range(self.dimension):
+            shape = [len(points)] + [1] * self.dimension
+            shape[axis + 1] = size
+            index.append(
+                (first[:, axis, None] + np.arange(size)).reshape(shape)
+            )
+            weight = weight * weights[:, axis].reshape(shape)
+        stencil = self.values[tuple(index)]
+        return np.einsum(
+            "nk,nkc->nc",
+            weight.reshape(len(points), -1),
+            stencil.reshape(len(points), -1, self.values.shape[-1]),
+        )
+
+    def split(self, values):
+        """Split interpolated components like the original field."""
+        bounds = np.cumsum(self.parts)[:-1]
+        return np.split(values, bounds, axis=-1)
+
+    def __call__(self, r):
+        """Drop-in replacement for the original `field(r)`.
+
+        For a single point the NumPy overhead of `interpolate` would
+        dominate, so the stencil is computed with plain floats.
+        """
+        starts = []
+        weight = [1.0]
+        for x, lower, spacing, n in zip(
+                r, self._lower, self._spacing, self._shape):
+            x = (x - lower) / spacing
+            if self.order == 1:
+                base = min(max(math.floor(x), 0), n - 2)
+                t = x - base
+                axis_weights = (1 - t, t)
+            else:
+                base = min(max(math.floor(x), 1), n - 3)
+                axis_weights = cubic_weights(x - base)
+                base -= 1
+            starts.append(base)
+            weight = [w * u for w in weight for u in axis_weights]
+        size = self.order + 1
+        block = self.values[tuple(
+            slice(start, start + size) for start in starts
+        )]
+        values = np.dot(weight, block.reshape(len(weight), -1)).tolist()
+        parts = []
+        for length in self.parts:
+            parts.append(jim.Vector(*values[:length]))
+            values = values[length:]
+        return parts[0] if len(parts) == 1 else tuple(parts)
+
+    def error(self, field, samples=1000, seed=0):
+        """Compare the interpolation with `field` at `samples` random
+        points inside of the lattice. The errors are relative to the
+        RMS of the exact field; returns a dict with the RMS and the
+        maximum error.
+        """
+        rng = np.random.default_rng(seed)
+        points = rng.uniform(
+            self.lower, self.upper, (samples, self.dimension)
+        )
+        exact = np.array([
+            self._flatten(field(jim.Vector(*point)))[0]
+            for point in points.tolist()
+        ])
+        difference = self.interpolate(points) - exact
+        scale = np.sqrt(np.mean(np.einsum("ij,ij->i", exact, exact)))
+        error = np.linalg.norm(difference, axis=1) / scale
+        return {
+            "order": self.order,
+            "rms": float(np.sqrt(np.mean(error ** 2))),
+            "max": float(error.max()),
+        }
+
+
+class GriddedLorentzForce(jim.Force):
+    """`lorentz_force` in a static `(E, B)` field given as a
+    `FieldGrid`; the field at all bodies is interpolated at once.
+    """
+
+    def __init__(self, grid, bodies=None):
+        super().__init__(bodies)
+        self.grid = grid
+
+    def acceleration(self, universe, body):
+        self.evaluations += 1
+        return jim.lorentz_force(body, self.grid) / body.m
+
+    def electromagnetic_field(self):
+        return self.grid
+
+    def accumulate(self, universe, index, accelerations):
+        bodies = [body for body in index if self.acts_on(body)]
+        if not bodies:
+            return
+        E, B = self.grid.split(
+            self.grid.interpolate([tuple(body.r) for body in bodies])
+        )
+        v = np.array([tuple(body.v) for body in bodies])
+        q_over_m = np.array([body.q / body.m for body in bodies])[:, None]
+        a = q_over_m * (E + np.cross(v, B))
+        self.evaluations += len(bodies)
+        for body, a in zip(bodies, a.tolist()):
+            i = index[body]
+            accelerations[i] = accelerations[i] + jim.Vector(*a)
+
+    def __repr__(self):
+        return "GriddedLorentzForce(shape={}, bodies={})".format(
+            tuple(self.grid.shape),
+            "all" if self.bodies is None else len(self.bodies),
+        )
+
+
+def implement_gridded_field(
+        universe, field, lower, upper, shape, order=1, path=None):
+    """Like `implement_field(universe, partial(lorentz_force,
+    field=field))`, but with `field` sampled on a lattice.
+    """
+    grid = FieldGrid.sample(field, lower, upper, shape, order, path)
+    return universe.add_force(GriddedLorentzForce(grid, universe.bodies))
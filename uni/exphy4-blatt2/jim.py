@@ -1,14 +1,27 @@
+import heapq
 import random
 import sys
 import math
+import json
+import struct
+from array import array
 from functools import partial
 from collections import namedtuple
-from itertools import islice, product
+from itertools import islice
 
+try:
+    import numpy as np
+except ImportError:
+    # Only the batched kernels of `PairForce` need NumPy.
+    np = None
+
+
+CHECKPOINT_MAGIC = b"jim checkpoint 1\n"
 
 # define some physical constants
 G = 6.67 * 10**-11
 ε_0 = 8.854187817e-12
+c_0 = 299792458
 π = math.pi
 
 
@@ -17,8 +30,22 @@ class DimensionError(ValueError):
 
 
 class Vector(object):
-    def __init__(self, *xs):
-        self._xs = xs
+    """A vector of arbitrary dimension.
+
+    `Vector(*xs)` actually creates a `Vector2` or a `Vector3` for two
+    or three components. Those store their components in slots and
+    implement the arithmetic unrolled; all other dimensions fall back
+    to `VectorN`. Vectors are immutable: the fused `add_scaled` returns
+    a new vector, because states handed out by `Body.state` share
+    their vectors with the bodies.
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, *xs):
+        if cls is Vector:
+            cls = _VECTOR_TYPES.get(len(xs), VectorN)
+        return object.__new__(cls)
 
     @classmethod
     def null_vector(cls, dimension):
@@ -30,9 +57,17 @@ class Vector(object):
         xs[direction] = 1
         return cls(*xs)
 
+    @classmethod
+    def random(cls, dimension, limit=10):
+        return cls(*[random.uniform(-limit, limit) for _ in range(dimension)])
+
     def __repr__(self):
         return "Vector({})".format(", ".join(map(str, self)))
 
+    @property
+    def xs(self):
+        return tuple(self)
+
     @property
     def norm(self):
         return math.sqrt(sum(x * x for x in self))
@@ -45,19 +80,35 @@ class Vector(object):
     def zero(self):
         return Vector(*((0,) * len(self)))
 
+    def project_onto(self, other):
+        return other.unit * (self * other.unit)
+
+    def add_scaled(self, other, factor):
+        """`self + other * factor` without the temporary."""
+        if len(self) != len(other):
+            raise DimensionError
+        return Vector(*(x + y * factor for x, y in zip(self, other)))
+
     def __add__(self, other):
         if len(self) != len(other):
             raise DimensionError
         return Vector(*(x + y for x, y in zip(self, other)))
 
     def __sub__(self, other):
-        return self + (-other)
+        if len(self) != len(other):
+            raise DimensionError
+        return Vector(*(x - y for x, y in zip(self, other)))
 
     def __neg__(self):
         return Vector(*(-x for x in self))
 
     def __mul__(self, other):
-        return Vector(*(x * other for x in self))
+        if isinstance(other, Vector):
+            if len(self) != len(other):
+                raise DimensionError
+            return sum(s * o for s, o in zip(self, other))
+        else:
+            return Vector(*(x * other for x in self))
 
     def __rmul__(self, other):
         return self * other
@@ -65,6 +116,28 @@ class Vector(object):
     def __truediv__(self, other):
         return self * (1 / other)
 
+    def __matmul__(self, other):
+        if (len(self), len(other)) != (3, 3):
+            raise DimensionError
+        x, y, z = self
+        a, b, c = other
+        return Vector(
+            y * c - z * b,
+            z * a - x * c,
+            x * b - y * a
+        )
+
+
+class VectorN(Vector):
+    __slots__ = ("_xs",)
+
+    def __init__(self, *xs):
+        self._xs = xs
+
+    @property
+    def xs(self):
+        return self._xs
+
     def __len__(self):
         return len(self._xs)
 
@@ -75,27 +148,276 @@ class Vector(object):
         return iter(self._xs)
 
 
+def _vector2(x, y, new=object.__new__):
+    vector = new(Vector2)
+    vector.x = x
+    vector.y = y
+    return vector
+
+
+def _vector3(x, y, z, new=object.__new__):
+    vector = new(Vector3)
+    vector.x = x
+    vector.y = y
+    vector.z = z
+    return vector
+
+
+class Vector2(Vector):
+    __slots__ = ("x", "y")
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+    @property
+    def xs(self):
+        return self.x, self.y
+
+    @property
+    def norm(self):
+        return math.sqrt(self.x * self.x + self.y * self.y)
+
+    @property
+    def unit(self):
+        factor = 1 / math.sqrt(self.x * self.x + self.y * self.y)
+        return _vector2(self.x * factor, self.y * factor)
+
+    @property
+    def zero(self):
+        return _vector2(0, 0)
+
+    def add_scaled(self, other, factor):
+        if type(other) is not Vector2:
+            return super().add_scaled(other, factor)
+        return _vector2(self.x + other.x * factor, self.y + other.y * factor)
+
+    def __add__(self, other):
+        if type(other) is not Vector2:
+            return super().__add__(other)
+        return _vector2(self.x + other.x, self.y + other.y)
+
+    def __sub__(self, other):
+        if type(other) is not Vector2:
+            return super().__sub__(other)
+        return _vector2(self.x - other.x, self.y - other.y)
+
+    def __neg__(self):
+        return _vector2(-self.x, -self.y)
+
+    def __mul__(self, other):
+        if isinstance(other, Vector):
+            if type(other) is not Vector2:
+                raise DimensionError
+            return self.x * other.x + self.y * other.y
+        return _vector2(self.x * other, self.y * other)
+
+    def __rmul__(self, other):
+        return _vector2(self.x * other, self.y * other)
+
+    def __truediv__(self, other):
+        factor = 1 / other
+        return _vector2(self.x * factor, self.y * factor)
+
+    def __len__(self):
+        return 2
+
+    def __getitem__(self, item):
+        return (self.x, self.y)[item]
+
+    def __iter__(self):
+        return iter((self.x, self.y))
+
+
+class Vector3(Vector):
+    __slots__ = ("x", "y", "z")
+
+    def __init__(self, x, y, z):
+        self.x = x
+        self.y = y
+        self.z = z
+
+    @property
+    def xs(self):
+        return self.x, self.y, self.z
+
+    @property
+    def norm(self):
+        return math.sqrt(self.x * self.x + self.y * self.y + self.z * self.z)
+
+    @property
+    def unit(self):
+        factor = 1 / math.sqrt(
+            self.x * self.x + self.y * self.y + self.z * self.z
+        )
+        return _vector3(self.x * factor, self.y * factor, self.z * factor)
+
+    @property
+    def zero(self):
+        return _vector3(0, 0, 0)
+
+    def add_scaled(self, other, factor):
+        if type(other) is not Vector3:
+            return super().add_scaled(other, factor)
+        return _vector3(
+            self.x + other.x * factor,
+            self.y + other.y * factor,
+            self.z + other.z * factor,
+        )
+
+    def __add__(self, other):
+        if type(other) is not Vector3:
+            return super().__add__(other)
+        return _vector3(self.x + other.x, self.y + other.y, self.z + other.z)
+
+    def __sub__(self, other):
+        if type(other) is not Vector3:
+            return super().__sub__(other)
+        return _vector3(self.x - other.x, self.y - other.y, self.z - other.z)
+
+    def __neg__(self):
+        return _vector3(-self.x, -self.y, -self.z)
+
+    def __mul__(self, other):
+        if isinstance(other, Vector):
+            if type(other) is not Vector3:
+                raise DimensionError
+            return self.x * other.x + self.y * other.y + self.z * other.z
+        return _vector3(self.x * other, self.y * other, self.z * other)
+
+    def __rmul__(self, other):
+        return _vector3(self.x * other, self.y * other, self.z * other)
+
+    def __truediv__(self, other):
+        factor = 1 / other
+        return _vector3(self.x * factor, self.y * factor, self.z * factor)
+
+    def __matmul__(self, other):
+        if type(other) is not Vector3:
+            raise DimensionError
+        x, y, z = self.x, self.y, self.z
+        a, b, c = other.x, other.y, other.z
+        return _vector3(
+            y * c - z * b,
+            z * a - x * c,
+            x * b - y * a
+        )
+
+    def __len__(self):
+        return 3
+
+    def __getitem__(self, item):
+        return (self.x, self.y, self.z)[item]
+
+    def __iter__(self):
+        return iter((self.x, self.y, self.z))
+
+
+_VECTOR_TYPES = {2: Vector2, 3: Vector3}
+
+
 class Body(object):
     State = namedtuple("BodyState", "r, v, a, m")
+    # Order of the equation of motion: `r'' = a`. Bodies without an
+    # `order` are treated as `r' = v` by the integrators.
+    order = 2
+    # Set by `Universe.add`.
+    universe = None
+    # Attributes saved by `Universe.checkpoint`.
+    checkpoint_fields = ("r", "v", "m", "q")
 
     def __init__(self, r, v, a, m):
-        self.r = r
-        self.v = v
+        # The acceleration is cached until `r` of this body or of one
+        # of the bodies it depends on (see `depend_on`), `v` of this
+        # body (if the acceleration may depend on it) or the `epoch` of
+        # its universe changes.
+        self._a = None
+        self._epoch = None
+        self.dependents = []
         if a is not None:
             self.accelerations = [a]
         else:
             self.accelerations = []
+        # Whether one of `accelerations` may depend on `v`.
+        self.velocity_dependent = a is not None
+        self.r = r
+        self.v = v
         self.m = m
 
-    def move(self, dt):
-        self.r = self.r + self.v * dt
-        self.v = self.v + self.a * dt
+    @property
+    def r(self):
+        return self._r
+
+    @r.setter
+    def r(self, r):
+        self._r = r
+        self.invalidate()
+
+    @property
+    def v(self):
+        return self._v
+
+    @v.setter
+    def v(self, v):
+        self._v = v
+        # Coupled forces only depend on the positions.
+        universe = self.universe
+        if self.velocity_dependent or (
+                universe is not None and universe.velocity_dependent):
+            self._a = None
+
+    def invalidate(self):
+        self._a = None
+        for body in self.dependents:
+            body._a = None
+        if self.universe is not None and self.universe.coupled:
+            # Advances the epoch once before the next acceleration is
+            # read, not for every body that moves in between.
+            self.universe.moved = True
+
+    def _current_epoch(self):
+        if self.universe is None:
+            return None
+        return self.universe.current_epoch()
+
+    def depend_on(self, other):
+        """Declare that the acceleration of `self` depends on the
+        position of `other`."""
+        other.dependents.append(self)
 
-    def add_acceleration(self, a):
+    def move(self, dt):
+        self.r = self.r.add_scaled(self.v, dt)
+        self.v = self.v.add_scaled(self.a, dt)
+
+    def add_acceleration(self, a, velocity_dependent=True):
+        """Add `a(body)`; pass `velocity_dependent=False` if it only
+        depends on positions, so that changing `v` keeps the cached
+        acceleration.
+        """
         self.accelerations.append(a)
+        self.velocity_dependent = self.velocity_dependent or velocity_dependent
+        self._a = None
+        return a
 
     @property
     def a(self):
+        epoch = self._current_epoch()
+        if self._a is None or self._epoch != epoch:
+            self._a = self.acceleration()
+            self._epoch = epoch
+        return self._a
+
+    def acceleration(self):
+        """Evaluate all accelerations, bypassing the cache."""
+        a = self.local_acceleration()
+        if self.universe is not None:
+            for force in self.universe.forces:
+                if force.acts_on(self):
+                    a = a + force.acceleration(self.universe, self)
+        return a
+
+    def local_acceleration(self):
+        """Sum of the accelerations added to this body only."""
         if self.accelerations:
             return sum(
                 (accelerate(self) for accelerate in self.accelerations[1:]),
@@ -108,8 +430,10 @@ class Body(object):
     def f(self):
         return self.m * self.a
 
-    def add_force(self, force):
-        self.add_acceleration(lambda self: force(self) / self.m)
+    def add_force(self, force, velocity_dependent=True):
+        return self.add_acceleration(
+            lambda self: force(self) / self.m, velocity_dependent
+        )
 
     def state(self):
         return self.State(self.r, self.v, self.a, self.m)
@@ -119,16 +443,20 @@ class Body(object):
 
 
 class RadioactiveBody(Body):
+    checkpoint_fields = Body.checkpoint_fields + ("λ", "decay_time")
+
     def __init__(self, λ, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.λ = λ
-
-    def is_decayed_after(self, dt):
-        return random.random() > math.exp(-self.λ * dt)
+        # Time from being added to a universe until the decay.
+        self.lifetime = draw_lifetime(λ)
 
 
 class Planet(object):
     State = namedtuple("PlanetState", "r, v, a, phi, omega, radius, m")
+    checkpoint_fields = ("phi", "omega", "radius", "m")
+    # Planets move on a fixed orbit, so only their own `move` is used.
+    order = 0
 
     def __init__(self, phi_0, omega, radius, m):
         self.phi = phi_0
@@ -136,7 +464,7 @@ class Planet(object):
         self.radius = radius
         self.m = m
 
-    def move(self, t, dt):
+    def move(self, dt):
         self.phi = (self.phi + self.omega * dt) % (2 * math.pi)
 
     @property
@@ -151,12 +479,12 @@ class Planet(object):
     def a(self):
         return self.omega ** 2 * (-self.r)
 
-    def add_acceleration(self, _a):
+    def add_acceleration(self, _a, velocity_dependent=True):
         # This body is not influenced by any accelerations.
         # It just rotates.
         pass
 
-    def add_force(self, _force):
+    def add_force(self, _force, velocity_dependent=True):
         # Same here.
         pass
 
@@ -169,6 +497,7 @@ class Planet(object):
 
 class Circle(Body):
     State = namedtuple("CircleState", "r, v, a, m, radius")
+    checkpoint_fields = Body.checkpoint_fields + ("radius",)
 
     def __init__(self, radius, *args, **kwargs):
         super(Circle, self).__init__(*args, **kwargs)
@@ -180,43 +509,548 @@ class Circle(Body):
         )
 
 
-class Spring(object):
-    def __init__(self, length, D, bodies):
+def describe(function):
+    """A description of `function` that is the same in every process:
+    qualified names instead of reprs with addresses, also for the
+    function and the arguments of a `partial`.
+    """
+    if isinstance(function, partial):
+        return "{}({})".format(describe(function.func), ", ".join(
+            [describe(argument) for argument in function.args]
+            + [
+                "{}={}".format(name, describe(argument))
+                for name, argument in function.keywords.items()
+            ]
+        ))
+    if hasattr(function, "__qualname__"):
+        return function.__qualname__
+    if type(function).__repr__ is not object.__repr__:
+        return repr(function)
+    return type(function).__qualname__
+
+
+class Force(object):
+    """A force registered with `Universe.add_force`.
+
+    `bodies` are the bodies the force acts on; `None` means all bodies
+    of the universe. Subclasses implement `acceleration` for a single
+    body and may override `accumulate` to handle all bodies in a single
+    pass. `evaluations` counts how often the underlying force law ran.
+    """
+
+    # Whether the force on a body depends on the positions of other
+    # bodies.
+    coupled = False
+    # Whether the force on a body may depend on its velocity.
+    velocity_dependent = True
+    # Whether the force takes energy out of the system.
+    dissipative = False
+
+    def __init__(self, bodies=None):
+        self.bodies = None if bodies is None else list(bodies)
+        # Positions in `bodies`, so that bodies can be discarded in O(1).
+        self._targets = None if bodies is None else {
+            body: n for n, body in enumerate(self.bodies)
+        }
+        self.evaluations = 0
+
+    def acts_on(self, body):
+        return self._targets is None or body in self._targets
+
+    def discard(self, body):
+        """Stop acting on `body`; the last body takes its place."""
+        if self._targets is None or body not in self._targets:
+            return
+        position = self._targets.pop(body)
+        last = self.bodies.pop()
+        if last is not body:
+            self.bodies[position] = last
+            self._targets[last] = position
+
+    def acceleration(self, universe, body):
+        raise NotImplementedError
+
+    def electromagnetic_field(self):
+        """The static `field(r) -> (E, B)` of a `lorentz_force`, or
+        `None` for other forces.
+        """
+        return None
+
+    def potential_energy(self, universe):
+        """Potential energy of all bodies the force acts on, or `None`
+        if the force has no known potential.
+        """
+        return None
+
+    def accumulate(self, universe, index, accelerations):
+        """Add the accelerations of the bodies in `index`, a dict from
+        bodies to their positions in the list `accelerations`.
+        """
+        for body, i in index.items():
+            if self.acts_on(body):
+                accelerations[i] = (
+                    accelerations[i] + self.acceleration(universe, body)
+                )
+
+    def sources(self, universe):
+        if self.bodies is None:
+            return universe.integrated_bodies(order=2)
+        return self.bodies
+
+    def count(self, removed=()):
+        """The number of bodies the force acts on without those in
+        `removed`, or `"all"`."""
+        if self.bodies is None:
+            return "all"
+        return sum(body not in removed for body in self.bodies)
+
+    def description(self, removed=()):
+        """A description for checkpoints that is the same in every
+        process, as if the bodies in `removed` were discarded.
+        """
+        return "{}(bodies={})".format(type(self).__name__, self.count(removed))
+
+    def __repr__(self):
+        return self.description()
+
+
+class UniformGravity(Force):
+    """The `gravity` of the universe."""
+
+    velocity_dependent = False
+
+    def acceleration(self, universe, body):
+        self.evaluations += 1
+        return universe.gravity
+
+    def potential_energy(self, universe):
+        return -sum(
+            body.m * (universe.gravity * body.r)
+            for body in self.sources(universe)
+        )
+
+
+class HarmonicTrap(Force):
+    """The harmonic `background_force` `-m ω² (r - centre)`."""
+
+    velocity_dependent = False
+
+    def __init__(self, ω, centre=None, bodies=None):
+        super().__init__(bodies)
+        self.ω = ω
+        self.centre = centre
+
+    def displacement(self, body):
+        if self.centre is None:
+            return body.r
+        return body.r - self.centre
+
+    def acceleration(self, universe, body):
+        self.evaluations += 1
+        return self.displacement(body) * -self.ω ** 2
+
+    def potential_energy(self, universe):
+        return sum(
+            0.5 * body.m * self.ω ** 2 * self.displacement(body).norm ** 2
+            for body in self.sources(universe)
+        )
+
+    def description(self, removed=()):
+        return "HarmonicTrap(ω={}, bodies={})".format(
+            self.ω, self.count(removed)
+        )
+
+
+class Field(Force):
+    """A force that only depends on the body it acts on, like an
+    external field or `friction`: `force(body)`.
+    """
+
+    def __init__(self, force, bodies=None):
+        super().__init__(bodies)
+        self.force = force
+
+    def acceleration(self, universe, body):
+        self.evaluations += 1
+        return self.force(body) / body.m
+
+    def electromagnetic_field(self):
+        force = self.force
+        if isinstance(force, partial) and force.func is lorentz_force:
+            return force.keywords["field"]
+        return None
+
+    def potential_energy(self, universe):
+        # The magnetic force is perpendicular to the velocity and does
+        # no work, so a field that is purely magnetic where the bodies
+        # are adds nothing to the energy, which then is the kinetic
+        # energy alone.
+        field = self.electromagnetic_field()
+        if field is not None and all(
+                field(body.r)[0].norm == 0
+                for body in self.sources(universe)):
+            return 0
+        return None
+
+    def description(self, removed=()):
+        return "{}({}, bodies={})".format(
+            type(self).__name__, describe(self.force), self.count(removed)
+        )
+
+
+class Dissipation(Field):
+    dissipative = True
+
+
+# Below this many bodies, calling the force for every pair is faster
+# than copying the bodies into arrays (for all bodies at once, as in
+# `Universe.compute_accelerations`, and for a single body, as in
+# `Body.a`).
+BATCH_SIZE = 8
+SINGLE_BATCH_SIZE = 32
+
+
+class PairForce(Force):
+    """A force between every two bodies, like `gravitate`:
+    `force(body, other)` is the force on `body`, and the force on
+    `other` is assumed to be its negative.
+
+    `gravitate` and `coulomb_force` are evaluated with
+    `inverse_square_field` when NumPy is installed and there are enough
+    bodies. `force` may only depend on the positions of the bodies.
+    """
+
+    coupled = True
+    velocity_dependent = False
+
+    def __init__(self, force, bodies=None, potential=None):
+        """`potential(body, other)` is the potential energy of a pair;
+        it defaults to the one in `PAIR_POTENTIALS` for `force`.
+        """
+        super().__init__(bodies)
+        self.force = force
+        self.potential = potential
+
+    def batched(self, sources, single=False):
+        """Whether the accelerations by `sources` are computed with the
+        NumPy kernels instead of calling `force` for every pair."""
+        return (
+            np is not None
+            and self.force in PAIR_SOURCES
+            and len(sources) >= (SINGLE_BATCH_SIZE if single else BATCH_SIZE)
+        )
+
+    def _arrays(self, sources):
+        r = np.array([tuple(body.r) for body in sources], dtype=float)
+        m = np.array([body.m for body in sources], dtype=float)
+        s = np.array(
+            [getattr(body, PAIR_SOURCES[self.force]) for body in sources],
+            dtype=float,
+        )
+        return r, m, s
+
+    def _coupling(self, m, s):
+        """Factor from the inverse square field to the acceleration."""
+        if self.force is gravitate:
+            return G
+        return -s / (4 * π * ε_0 * m)
+
+    def acceleration(self, universe, body):
+        sources = self.sources(universe)
+        if self.batched(sources, single=True):
+            r, m, s = self._arrays(sources)
+            d = r - np.array(tuple(body.r), dtype=float)
+            distance_squared = np.einsum("ij,ij->i", d, d)
+            others = [other is not body for other in sources]
+            self.evaluations += sum(others)
+            # The body itself is at distance zero.
+            distance_squared[np.logical_not(others)] = np.inf
+            field = (s / distance_squared ** 1.5) @ d
+            coupling = self._coupling(
+                body.m, getattr(body, PAIR_SOURCES[self.force])
+            )
+            return Vector(*(coupling * field).tolist())
+        total = body.r.zero
+        for other in sources:
+            if other is not body:
+                total = total + self.force(body, other)
+                self.evaluations += 1
+        return total / body.m
+
+    def accumulate(self, universe, index, accelerations):
+        sources = self.sources(universe)
+        if not all(body in index for body in sources):
+            return super().accumulate(universe, index, accelerations)
+        if self.batched(sources):
+            r, m, s = self._arrays(sources)
+            coupling = self._coupling(m, s)
+            if not np.isscalar(coupling):
+                coupling = coupling[:, np.newaxis]
+            a = coupling * inverse_square_field(r, s)
+            self.evaluations += len(sources) * (len(sources) - 1) // 2
+            for body, a in zip(sources, a.tolist()):
+                i = index[body]
+                accelerations[i] = accelerations[i] + Vector(*a)
+            return
+        # Every pair only once, using Newton’s third law.
+        forces = [body.r.zero for body in sources]
+        for i, body in enumerate(sources):
+            for j in range(i + 1, len(sources)):
+                f = self.force(body, sources[j])
+                forces[i] = forces[i] + f
+                forces[j] = forces[j] - f
+        self.evaluations += len(sources) * (len(sources) - 1) // 2
+        for body, f in zip(sources, forces):
+            i = index[body]
+            accelerations[i] = accelerations[i] + f / body.m
+
+    def potential_energy(self, universe):
+        potential = self.potential or PAIR_POTENTIALS.get(self.force)
+        if potential is None:
+            return None
+        sources = self.sources(universe)
+        if self.potential is None and self.batched(sources):
+            r, _, s = self._arrays(sources)
+            if self.force is gravitate:
+                return -G * inverse_distance_sum(r, s)
+            return inverse_distance_sum(r, s) / (4 * π * ε_0)
+        return sum(
+            potential(body, sources[j])
+            for i, body in enumerate(sources)
+            for j in range(i + 1, len(sources))
+        )
+
+    def description(self, removed=()):
+        return "PairForce({}, bodies={})".format(
+            describe(self.force), self.count(removed)
+        )
+
+
+class Spring(Force):
+    """A spring between two bodies.
+
+    By default the spring attaches its force to both bodies. With
+    `attach=False` it is only used as a bonded force registered with
+    `Universe.add_force`.
+    """
+
+    coupled = True
+    velocity_dependent = False
+
+    def __init__(self, length, D, bodies, attach=True):
+        super().__init__(bodies)
         self.length = length
         self.D = D
-        self.bodies = bodies
-        bodies[0].add_force(partial(self.restoring_force, bodies[1]))
-        bodies[1].add_force(partial(self.restoring_force, bodies[0]))
+        self._positions = None
+        # The accelerations added to the bodies.
+        self.attached = []
+        if attach:
+            self.attached = [
+                bodies[0].add_force(
+                    partial(self.restoring_force, bodies[1]),
+                    velocity_dependent=False,
+                ),
+                bodies[1].add_force(
+                    partial(self.restoring_force, bodies[0]),
+                    velocity_dependent=False,
+                ),
+            ]
+            bodies[0].depend_on(bodies[1])
+            bodies[1].depend_on(bodies[0])
 
     def restoring_force(self, other, body):
-        return self.D * (
-            (body.r - other.r).norm - self.length
-        ) * (other.r - body.r).unit
+        # Both ends feel the same force with opposite signs, so it is
+        # only computed once for every pair of positions.
+        first, second = self.bodies
+        positions = self._positions
+        if (
+                positions is None
+                or positions[0] is not first.r
+                or positions[1] is not second.r):
+            self._positions = first.r, second.r
+            self._force = self.D * (
+                (first.r - second.r).norm - self.length
+            ) * (second.r - first.r).unit
+            self.evaluations += 1
+        return self._force if body is first else -self._force
+
+    def acceleration(self, universe, body):
+        first, second = self.bodies
+        other = second if body is first else first
+        return self.restoring_force(other, body) / body.m
+
+    def potential_energy(self, universe):
+        first, second = self.bodies
+        return 0.5 * self.D * ((first.r - second.r).norm - self.length) ** 2
+
+    def description(self, removed=()):
+        return "Spring(length={0.length}, D={0.D})".format(self)
 
 
 class Universe(object):
-    def __init__(self, gravity, start_time=0):
+    def __init__(self, gravity, start_time=0, integrator="euler"):
         self.gravity = gravity
-        self.time = start_time
         self.bodies = []
+        self.forces = []
+        self.monitors = []
+        # Cached accelerations are only valid for the current `epoch`.
+        # It changes with the time and, when `coupled` forces are
+        # registered, with the position of any body (see
+        # `current_epoch`).
+        self.epoch = 0
+        self.moved = False
+        self.coupled = False
+        self.velocity_dependent = False
+        self.time = start_time
+        if isinstance(integrator, str):
+            integrator = INTEGRATORS[integrator]
+        self.integrator = integrator
+        if gravity.norm:
+            self.add_force(UniformGravity())
+
+    @property
+    def time(self):
+        return self._time
+
+    @time.setter
+    def time(self, time):
+        self._time = time
+        self.epoch += 1
 
     def __iter__(self):
         return iter(self.bodies)
 
     def add(self, body):
-        if self.gravity.norm:
-            body.add_acceleration(lambda body: self.gravity)
+        body.universe = self
+        # Identifies the body in checkpoints, even after other bodies
+        # were removed.
+        body.serial = self.added = getattr(self, "added", 0) + 1
         self.bodies.append(body)
 
+    def remove(self, body):
+        self.bodies.remove(body)
+        for force in self.forces:
+            force.discard(body)
+        self.epoch += 1
+
+    def add_force(self, force):
+        """Register a `Force` with the universe."""
+        self.forces.append(force)
+        self._forces_changed()
+        return force
+
+    def remove_force(self, force):
+        self.forces.remove(force)
+        self._forces_changed()
+
+    def _forces_changed(self):
+        self.coupled = any(force.coupled for force in self.forces)
+        self.velocity_dependent = any(
+            force.velocity_dependent for force in self.forces
+        )
+        self.epoch += 1
+
+    def current_epoch(self):
+        """The `epoch`, advanced first if a body moved since the last
+        call while `coupled` forces are registered."""
+        if self.moved:
+            self.moved = False
+            self.epoch += 1
+        return self.epoch
+
+    def compute_accelerations(self, bodies=None):
+        """Accelerations of `bodies` (all bodies with `order == 2` by
+        default), with every registered force evaluated in one pass.
+        The results are cached in the bodies.
+        """
+        if bodies is None:
+            bodies = self.integrated_bodies(order=2)
+        epoch = self.current_epoch()
+        if all(
+                body._a is not None and body._epoch == epoch
+                for body in bodies):
+            return [body._a for body in bodies]
+        index = {body: i for i, body in enumerate(bodies)}
+        accelerations = [body.local_acceleration() for body in bodies]
+        for force in self.forces:
+            force.accumulate(self, index, accelerations)
+        for body, a in zip(bodies, accelerations):
+            body._a = a
+            body._epoch = epoch
+        return accelerations
+
     def add_all(self, bodies):
         for body in bodies:
             self.add(body)
 
     def step(self, dt):
+        self.integrator(self, dt)
+        self.after_step(dt)
+
+    def after_step(self, dt):
+        """Run after the bodies were moved by `dt`, while `self.time`
+        is still the time at the start of the step. Mixins that bounce
+        or remove bodies extend this instead of `step`, so that
+        `simulate_adaptive` runs them, too.
+        """
+        for monitor in self.monitors:
+            monitor.after_step(dt)
+
+    def add_monitor(self, monitor):
+        """Let `monitor.after_step(dt)` run after every step."""
+        self.monitors.append(monitor)
+        return monitor
+
+    def integrated_bodies(self, order=1):
+        return [
+            body for body in self.bodies
+            if getattr(body, "order", 1) >= order
+        ]
+
+    def drift(self, dt):
+        for body in self.integrated_bodies():
+            body.r = body.r.add_scaled(body.v, dt)
+
+    def kick(self, dt):
+        bodies = self.integrated_bodies(order=2)
+        accelerations = self.compute_accelerations(bodies)
+        for body, a in zip(bodies, accelerations):
+            body.v = body.v.add_scaled(a, dt)
+
+    def move_kinematic(self, dt):
         for body in self.bodies:
-            body.move(dt)
+            if getattr(body, "order", 1) == 0:
+                body.move(dt)
+
+    def get_state(self):
+        """All positions and velocities as one flat `Vector`."""
+        xs = []
+        for body in self.integrated_bodies():
+            xs.extend(body.r)
+            if getattr(body, "order", 1) == 2:
+                xs.extend(body.v)
+        return Vector(*xs)
+
+    def set_state(self, state):
+        xs = iter(state)
+        for body in self.integrated_bodies():
+            body.r = Vector(*islice(xs, len(body.r)))
+            if getattr(body, "order", 1) == 2:
+                body.v = Vector(*islice(xs, len(body.v)))
+
+    def derivative(self):
+        """Time derivative of `get_state()` at the current state."""
+        self.compute_accelerations()
+        xs = []
+        for body in self.integrated_bodies():
+            xs.extend(body.v)
+            if getattr(body, "order", 1) == 2:
+                xs.extend(body.a)
+        return Vector(*xs)
 
     def state(self):
+        # Evaluate the accelerations that are not cached in one pass.
+        self.compute_accelerations()
         return [body.state() for body in self.bodies]
 
     def simulate(self, end_time, dt, until=lambda self: False):
@@ -228,19 +1062,579 @@ class Universe(object):
             yield self.state()
             self.time += dt
 
+    def simulate_shortstep(self, end_time, dt, steplen=0.005, until=lambda self: False):
+        for _ in range(int(end_time // dt)):
+            exhaust(self.simulate(dt, steplen, until))
+            if until(self):
+                return
+            yield self.state()
+
+    def simulate_adaptive(
+            self, end_time, dt, rtol=1e-6, atol=1e-9,
+            until=lambda self: False):
+        """Like `simulate`, but the internal steps are chosen by the
+        embedded Dormand–Prince 5(4) method so that the local error
+        stays below `atol + rtol * |y|`. The states every `dt` are
+        interpolated with the dense output of the method.
+
+        `after_step` runs after every accepted step. If it is extended
+        (e.g. by `BoxMixin` or `RadioactivityMixin`), the states cannot
+        be interpolated across a bounce or a decay, so the steps end at
+        the output times instead.
+        """
+        if type(self).step is not Universe.step:
+            raise TypeError(
+                "{} overrides step, which simulate_adaptive does not call; "
+                "extend after_step instead".format(type(self).__name__)
+            )
+        yield self.state()
+        outputs = [
+            self.time + (n + 1) * dt for n in range(int(end_time // dt))
+        ]
+        if not outputs:
+            return
+        hooks = type(self).after_step is not Universe.after_step
+        stepper = DormandPrince(self, rtol, atol)
+        for output_time in outputs:
+            if until(self):
+                return
+            while stepper.time < output_time:
+                stepper.step(output_time if hooks else outputs[-1])
+            if stepper.time == output_time:
+                yield self.state()
+                continue
+            stepper.interpolate(output_time)
+            yield self.state()
+            stepper.restore()
+        self.adaptive_steps = stepper.accepted, stepper.rejected
+
+    def checkpoint(self, path):
+        """Write a binary snapshot of the universe to `path`.
+
+        The file starts with a JSON header describing the universe and
+        its bodies, followed by all numbers as doubles.
+        """
+        header, values = self.snapshot()
+        header = json.dumps(header).encode()
+        with open(path, "wb") as file:
+            file.write(CHECKPOINT_MAGIC)
+            file.write(struct.pack("<Q", len(header)))
+            file.write(header)
+            array("d", values).tofile(file)
+
+    def restore(self, path):
+        """Continue from a checkpoint.
+
+        Forces are closures and cannot be saved, so the universe has to
+        be set up the same way as the one the checkpoint was taken
+        from. Resuming then reproduces the original trajectory bit for
+        bit (except for integrators with internal state, like
+        `BlockTimesteps`).
+        """
+        with open(path, "rb") as file:
+            if file.read(len(CHECKPOINT_MAGIC)) != CHECKPOINT_MAGIC:
+                raise ValueError("{} is not a checkpoint".format(path))
+            length, = struct.unpack("<Q", file.read(8))
+            header = json.loads(file.read(length).decode())
+            values = array("d", file.read())
+        self.load_snapshot(header, values)
+
+    def snapshot(self):
+        header = self._snapshot_header()
+        header["bodies"] = []
+        values = []
+        for body in self.bodies:
+            fields = []
+            for field in getattr(body, "checkpoint_fields", ("r",)):
+                if not hasattr(body, field):
+                    continue
+                value = getattr(body, field)
+                if isinstance(value, Vector):
+                    fields.append((field, len(value)))
+                    values.extend(value)
+                else:
+                    fields.append((field, 0))
+                    values.append(value)
+            header["bodies"].append({
+                "type": type(body).__name__,
+                "serial": getattr(body, "serial", None),
+                "fields": fields,
+            })
+        return header, values
+
+    def _snapshot_header(self, removed=()):
+        return {
+            "universe": type(self).__name__,
+            "time": self.time,
+            "gravity": list(self.gravity),
+            "size": getattr(self, "size", None),
+            "forces": [force.description(removed) for force in self.forces],
+            "random": random.getstate(),
+        }
+
+    def load_snapshot(self, header, values):
+        # Everything is checked before anything is changed, so that a
+        # mismatching checkpoint leaves the universe as it was.
+        by_serial = {body.serial: body for body in self.bodies}
+        if len(by_serial) != len(self.bodies):
+            raise ValueError("bodies must be added with `add`")
+        bodies = []
+        for description in header["bodies"]:
+            body = by_serial.pop(description["serial"], None)
+            if body is None or type(body).__name__ != description["type"]:
+                raise ValueError(
+                    "no {type} with serial {serial} in the universe"
+                    .format(**description)
+                )
+            bodies.append(body)
+        # Bodies that were removed (e. g. decayed) since the universe
+        # was created.
+        removed = set(by_serial.values())
+        self._check_snapshot_header(
+            header, ("universe", "size", "forces"), removed
+        )
+        expected = sum(
+            length or 1
+            for description in header["bodies"]
+            for _, length in description["fields"]
+        )
+        if len(values) != expected:
+            raise ValueError(
+                "checkpoint has {} values instead of {}".format(
+                    len(values), expected
+                )
+            )
+        values = iter(values)
+        for body, description in zip(bodies, header["bodies"]):
+            for field, length in description["fields"]:
+                if length:
+                    setattr(body, field, Vector(*islice(values, length)))
+                else:
+                    setattr(body, field, next(values))
+        for body in removed:
+            self.remove(body)
+        self.bodies[:] = bodies
+        version, internal, gauss = header["random"]
+        random.setstate((version, tuple(internal), gauss))
+        self.time = header["time"]
+
+    def _check_snapshot_header(self, header, keys, removed=()):
+        expected = self._snapshot_header(removed)
+        for key in keys:
+            if header[key] != expected[key]:
+                raise ValueError(
+                    "checkpoint has {} {!r}, but universe has {!r}".format(
+                        key, header[key], expected[key]
+                    )
+                )
+
     def __repr__(self):
         return "Universe(time={0.time}, bodies={0.bodies})".format(self)
 
 
+def euler(universe, dt):
+    """The explicit Euler method as implemented by `Body.move`."""
+    for body in universe.bodies:
+        body.move(dt)
+
+
+def velocity_verlet(universe, dt):
+    universe.kick(dt / 2)
+    universe.drift(dt)
+    universe.kick(dt / 2)
+    universe.move_kinematic(dt)
+
+
+def leapfrog(universe, dt):
+    universe.drift(dt / 2)
+    universe.kick(dt)
+    universe.drift(dt / 2)
+    universe.move_kinematic(dt)
+
+
+def rk4(universe, dt):
+    state = universe.get_state()
+    k1 = universe.derivative()
+    universe.set_state(state + k1 * (dt / 2))
+    k2 = universe.derivative()
+    universe.set_state(state + k2 * (dt / 2))
+    k3 = universe.derivative()
+    universe.set_state(state + k3 * dt)
+    k4 = universe.derivative()
+    universe.set_state(state + (k1 + 2 * k2 + 2 * k3 + k4) * (dt / 6))
+    universe.move_kinematic(dt)
+
+
+YOSHIDA_W1 = 1 / (2 - 2 ** (1 / 3))
+YOSHIDA_W0 = -2 ** (1 / 3) * YOSHIDA_W1
+
+
+def yoshida4(universe, dt):
+    """Fourth order symplectic integrator by composing three leapfrog
+    steps (Yoshida 1990).
+    """
+    universe.drift(YOSHIDA_W1 / 2 * dt)
+    universe.kick(YOSHIDA_W1 * dt)
+    universe.drift((YOSHIDA_W0 + YOSHIDA_W1) / 2 * dt)
+    universe.kick(YOSHIDA_W0 * dt)
+    universe.drift((YOSHIDA_W0 + YOSHIDA_W1) / 2 * dt)
+    universe.kick(YOSHIDA_W1 * dt)
+    universe.drift(YOSHIDA_W1 / 2 * dt)
+    universe.move_kinematic(dt)
+
+
+class DormandPrince(object):
+    """Adaptive Dormand–Prince 5(4) stepper with dense output, using
+    the coefficients of Hairer’s `DOPRI5`.
+    """
+
+    C = (0, 1 / 5, 3 / 10, 4 / 5, 8 / 9, 1, 1)
+    A = (
+        (),
+        (1 / 5,),
+        (3 / 40, 9 / 40),
+        (44 / 45, -56 / 15, 32 / 9),
+        (19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729),
+        (
+            9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176,
+            -5103 / 18656,
+        ),
+        (35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84),
+    )
+    E = (
+        71 / 57600, 0, -71 / 16695, 71 / 1920, -17253 / 339200,
+        22 / 525, -1 / 40,
+    )
+    D = (
+        -12715105075 / 11282082432, 0, 87487479700 / 32700410799,
+        -10690763975 / 1880347072, 701980252875 / 199316789632,
+        -1453857185 / 822651844, 69997945 / 29380423,
+    )
+
+    def __init__(self, universe, rtol, atol, first_step=None):
+        self.universe = universe
+        self.rtol = rtol
+        self.atol = atol
+        self.time = universe.time
+        self.y = universe.get_state()
+        self.k = [universe.derivative()]
+        self.h = first_step
+        self.accepted = 0
+        self.rejected = 0
+
+    def _stages(self, h):
+        k = self.k[:1]
+        for c, a in zip(self.C[1:], self.A[1:]):
+            self.universe.time = self.time + c * h
+            self.universe.set_state(combine(self.y, h, a, k))
+            k.append(self.universe.derivative())
+        return k
+
+    def _error(self, y, h, k):
+        error = combine(y.zero, h, self.E, k)
+        if not len(error):
+            return 0
+        return math.sqrt(sum(
+            (e / (self.atol + self.rtol * max(abs(y0), abs(y1)))) ** 2
+            for e, y0, y1 in zip(error, self.y, y)
+        ) / len(error))
+
+    def step(self, end_time):
+        if self.h is None:
+            self.h = (end_time - self.time) / 100
+        growth = 10
+        while True:
+            h = min(self.h, end_time - self.time)
+            k = self._stages(h)
+            # The last stage is evaluated at the new state (FSAL).
+            y = self.universe.get_state()
+            error = self._error(y, h, k)
+            self.h = h * min(
+                growth, max(0.2, 0.9 * (error or 1e-10) ** -0.2)
+            )
+            if error <= 1:
+                break
+            # Do not grow the step right after a rejection.
+            growth = 1
+            self.rejected += 1
+        self.accepted += 1
+        self.previous = self.time, self.y, h, k
+        universe = self.universe
+        universe.time = self.time
+        universe.move_kinematic(h)
+        epoch = universe.epoch
+        universe.after_step(h)
+        # Land exactly on `end_time`, so that a caller that asked for it
+        # can compare with it.
+        self.time = end_time if h == end_time - self.time else self.time + h
+        universe.time = self.time
+        self.y = universe.get_state()
+        if universe.epoch != epoch or list(self.y) != list(y):
+            # Bodies were bounced or removed, so the last stage is no
+            # longer the derivative at the new state.
+            self.k = [universe.derivative()]
+        else:
+            self.k = k[-1:]
+
+    def interpolate(self, time):
+        start, y0, h, k = self.previous
+        θ = (time - start) / h
+        y1 = self.y
+        r1 = y1 - y0
+        r2 = k[0] * h - r1
+        r3 = r1 - k[6] * h - r2
+        r4 = combine(y0.zero, h, self.D, k)
+        self.universe.set_state(
+            y0 + θ * (r1 + (1 - θ) * (r2 + θ * (r3 + (1 - θ) * r4)))
+        )
+        # Kinematic bodies are already at the end of the step; move
+        # them back to the output time, too.
+        self.universe.move_kinematic(time - self.time)
+        self.universe.time = time
+
+    def restore(self):
+        self.universe.move_kinematic(self.time - self.universe.time)
+        self.universe.set_state(self.y)
+        self.universe.time = self.time
+
+
+def combine(y, h, coefficients, ks):
+    """`y + h * Σ c_i k_i`, skipping zero coefficients."""
+    terms = [k * c for c, k in zip(coefficients, ks) if c]
+    if not terms:
+        return y
+    return y + sum(terms[1:], terms[0]) * h
+
+
+class BlockTimesteps(object):
+    """Hierarchical (block) individual time steps.
+
+    Every body sits on a level `k` and is advanced with its own step
+    `dt / 2**k`, chosen from the Aarseth criterion
+    `η * sqrt(|a| / |da/dt|)`. Within one universe step the bodies
+    whose steps end at the current sub-step are corrected with a
+    second order predictor–corrector; only their accelerations are
+    evaluated, using positions of all other bodies predicted to the
+    same time. Bodies with `order < 2` are advanced once per step.
+    """
+
+    def __init__(self, levels=8, η=0.02):
+        self.levels = levels
+        self.η = η
+        self.bodies = {}
+        self.evaluations = 0
+
+    def level(self, dt, a, jerk):
+        if not jerk.norm:
+            return 0
+        required = self.η * math.sqrt(a.norm / jerk.norm)
+        if not required:
+            return self.levels
+        return min(self.levels, max(0, math.ceil(math.log2(dt / required))))
+
+    def __call__(self, universe, dt):
+        bodies = universe.integrated_bodies(order=2)
+        substeps = 2 ** self.levels
+        dt_min = dt / substeps
+        # Block state: position, velocity and acceleration at the time
+        # `t` of the last correction, and the level.
+        blocks = {}
+        changed = []
+        for body in bodies:
+            block = self.bodies.get(body)
+            # Bodies that were moved since the last step (by a
+            # `BoxMixin`, `restore`, ...) start a new block.
+            if block is not None and (
+                    block[0] is body.r and block[1] is body.v):
+                blocks[body] = block
+            else:
+                changed.append(body)
+        if changed:
+            accelerations = universe.compute_accelerations(changed)
+            self.evaluations += len(changed)
+            for body, a in zip(changed, accelerations):
+                if body in self.bodies:
+                    level = self.bodies[body][4]
+                else:
+                    level = self.levels
+                blocks[body] = body.r, body.v, a, 0, level
+
+        for substep in range(1, substeps + 1):
+            active = [
+                body for body in bodies
+                if not substep % 2 ** (self.levels - blocks[body][4])
+            ]
+            if not active:
+                continue
+            t = substep * dt_min
+            for body in bodies:
+                r, v, a, t0, _ = blocks[body]
+                τ = t - t0
+                body.r = r + v * τ + a * (τ * τ / 2)
+                body.v = v + a * τ
+            accelerations = universe.compute_accelerations(active)
+            self.evaluations += len(active)
+            for body, a1 in zip(active, accelerations):
+                r, v, a, t0, level = blocks[body]
+                h = t - t0
+                body.v = v + (a + a1) * (h / 2)
+                body.r = r + v * h + (a * (1 / 3) + a1 * (1 / 6)) * (h * h)
+                new_level = self.level(dt, a1, (a1 - a) / h)
+                # Steps may only grow one level at a time, and only at
+                # times that are multiples of the larger step.
+                if new_level < level:
+                    new_level = level - 1
+                    if substep % 2 ** (self.levels - new_level):
+                        new_level = level
+                blocks[body] = body.r, body.v, a1, t, new_level
+
+        self.bodies = {
+            body: (r, v, a, 0, level)
+            for body, (r, v, a, _, level) in blocks.items()
+        }
+        for body in universe.integrated_bodies():
+            if getattr(body, "order", 1) == 1:
+                body.r = body.r.add_scaled(body.v, dt)
+        universe.move_kinematic(dt)
+
+
+class Boris(object):
+    """The Boris pusher for charged bodies in static fields registered
+    with `implement_field(universe, partial(lorentz_force, field=...))`.
+
+    Every step drifts the bodies for `dt / 2`, turns the velocity in the
+    magnetic field between two half kicks by the electric field (and by
+    all other forces, evaluated at the half step) and drifts again. The
+    rotation does not change `|v|`, so gyration in a pure magnetic field
+    neither spirals in nor out, even with steps of a tenth of the
+    gyration period. With `relativistic=True` the momentum per mass
+    `γ v` is pushed instead, for speed of light `c`.
+    """
+
+    def __init__(self, relativistic=False, c=c_0):
+        self.relativistic = relativistic
+        self.c = c
+
+    def __call__(self, universe, dt):
+        universe.drift(dt / 2)
+        bodies = universe.integrated_bodies(order=2)
+        fields = [
+            (force, force.electromagnetic_field())
+            for force in universe.forces
+        ]
+        index = {body: i for i, body in enumerate(bodies)}
+        accelerations = [body.local_acceleration() for body in bodies]
+        for force, field in fields:
+            if field is None:
+                force.accumulate(universe, index, accelerations)
+        for body, a in zip(bodies, accelerations):
+            E = B = body.r.zero
+            for force, field in fields:
+                if field is not None and force.acts_on(body):
+                    E_field, B_field = field(body.r)
+                    E, B = E + E_field, B + B_field
+            q_over_m = getattr(body, "q", 0) / body.m
+            body.v = self.push(body.v, a, E, B, q_over_m, dt)
+        universe.drift(dt / 2)
+        universe.move_kinematic(dt)
+
+    def push(self, v, a, E, B, q_over_m, dt):
+        """New velocity after the kicks by `a + q/m E` and the rotation
+        in `B`."""
+        kick = (a + E * q_over_m) * (dt / 2)
+        if self.relativistic:
+            u = self.momentum(v) + kick
+            γ = math.sqrt(1 + (u * u) / self.c ** 2)
+        else:
+            u = v + kick
+            γ = 1
+        if q_over_m and B * B:
+            t = B * (q_over_m * dt / 2 / γ)
+            s = t * (2 / (1 + t * t))
+            u = u + (u + u @ t) @ s
+        u = u + kick
+        if self.relativistic:
+            return u / math.sqrt(1 + (u * u) / self.c ** 2)
+        return u
+
+    def momentum(self, v):
+        return v / math.sqrt(1 - (v * v) / self.c ** 2)
+
+
+# The symplectic integrators (`velocity_verlet`, `leapfrog` and
+# `yoshida4`) only advance bodies with `order == 1` (`r' = v`) in their
+# drifts, which is first order accurate for them; use `rk4` for those.
+INTEGRATORS = {
+    "euler": euler,
+    "velocity_verlet": velocity_verlet,
+    "leapfrog": leapfrog,
+    "rk4": rk4,
+    "yoshida4": yoshida4,
+    "boris": Boris(),
+}
+
+
 class RadioactivityMixin:
-    def step(self, dt):
-        super().step(dt)
+    """Remove bodies when they decay.
+
+    Every decaying body gets an absolute `decay_time` when it is added,
+    and the decays are popped from a heap ordered by that time, so a
+    step only costs as much as the number of decays in it. Decayed
+    bodies are swapped with the last body and popped off the list,
+    which changes the order of the remaining bodies.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._decays = []
+        self._positions = {}
+        super().__init__(*args, **kwargs)
+
+    def after_step(self, dt):
+        super().after_step(dt)
         self.do_decays(dt)
 
+    def add(self, body):
+        super().add(body)
+        self._positions[body] = len(self.bodies) - 1
+        if does_decay(body):
+            lifetime = getattr(body, "lifetime", None)
+            if lifetime is None:
+                lifetime = draw_lifetime(body.λ)
+            body.decay_time = self.time + lifetime
+            self._schedule(body)
+
+    def _schedule(self, body):
+        heapq.heappush(self._decays, (body.decay_time, body.serial, body))
+
+    def remove(self, body):
+        position = self._positions.pop(body)
+        last = self.bodies.pop()
+        if last is not body:
+            self.bodies[position] = last
+            self._positions[last] = position
+        for force in self.forces:
+            force.discard(body)
+        self.epoch += 1
+
     def do_decays(self, dt):
-        for body in list(self):
-            if does_decay(body) and body.is_decayed_after(dt):
-                self.bodies.remove(body)
+        # Decays are due when they happen before the end of this step.
+        # Calling this twice for the same step does nothing the second
+        # time.
+        end = self.time + dt
+        while self._decays and self._decays[0][0] <= end:
+            decay_time, _, body = heapq.heappop(self._decays)
+            # Bodies that were removed otherwise or rescheduled by
+            # `load_snapshot` leave stale entries behind.
+            if body in self._positions and body.decay_time == decay_time:
+                self.remove(body)
+
+    def load_snapshot(self, header, values):
+        super().load_snapshot(header, values)
+        self._positions = {body: n for n, body in enumerate(self.bodies)}
+        self._decays = []
+        for body in self.bodies:
+            if does_decay(body):
+                self._schedule(body)
 
 
 class BoxMixin:
@@ -248,10 +1642,9 @@ class BoxMixin:
         super().__init__(*args, **kwargs)
         self.size = size
 
-    def step(self, dt):
-        super().step(dt)
+    def after_step(self, dt):
+        super().after_step(dt)
         self.check_box()
-        self.do_decays(dt)
 
     def check_box(self):
         for body in self:
@@ -270,6 +1663,10 @@ def does_decay(body):
     return hasattr(body, "λ") and body.λ > 0
 
 
+def draw_lifetime(λ):
+    return random.expovariate(λ) if λ > 0 else math.inf
+
+
 def transpose_states(states, attr="r"):
     attrs = (getattr(state, attr) for state in states)
     return list(zip(*attrs))
@@ -277,21 +1674,92 @@ def transpose_states(states, attr="r"):
 
 def gravitate(self, other):
     d = other.r - self.r
-    return G * self.m * other.m / (d.norm ** 2) * d.unit
+    distance = d.norm
+    return d * (G * self.m * other.m / (distance * distance * distance))
 
 
 def coulomb_force(self, other):
     d = self.r - other.r
-    return self.q * other.q / (4 * π * ε_0) * d.unit / (d.norm ** 2)
+    distance = d.norm
+    return d * (
+        self.q * other.q / (4 * π * ε_0 * distance * distance * distance)
+    )
+
+
+def gravitational_potential(self, other):
+    return -G * self.m * other.m / (other.r - self.r).norm
+
+
+def coulomb_potential(self, other):
+    return self.q * other.q / (4 * π * ε_0 * (other.r - self.r).norm)
+
+
+PAIR_POTENTIALS = {
+    gravitate: gravitational_potential,
+    coulomb_force: coulomb_potential,
+}
+
+# Pair forces that `PairForce` evaluates with `inverse_square_field`,
+# with the attribute of the bodies that is the source of the field.
+PAIR_SOURCES = {
+    gravitate: "m",
+    coulomb_force: "q",
+}
+
+
+def inverse_square_field(r, s, softening=0, block=256):
+    """Return `Σ_j s_j (r_j - r_i) / |r_j - r_i|³` for every body `i`.
+
+    This is the field that both `gravitate` (with `s = m`) and
+    `coulomb_force` (with `s = q`) are built from. The pairs are
+    evaluated `block` rows at a time to keep the temporaries small.
+    """
+    field = np.zeros_like(r)
+    for start in range(0, len(r), block):
+        stop = min(start + block, len(r))
+        d = r[np.newaxis, :, :] - r[start:stop, np.newaxis, :]
+        distance_squared = np.einsum("ijk,ijk->ij", d, d) + softening ** 2
+        rows = np.arange(stop - start)
+        distance_squared[rows, rows + start] = np.inf
+        field[start:stop] = np.einsum(
+            "ij,ijk->ik", s / distance_squared ** 1.5, d
+        )
+    return field
+
+
+def inverse_distance_sum(r, s, block=256):
+    """Return `Σ_{i<j} s_i s_j / |r_j - r_i|`, the potential energy of
+    `gravitational_potential` (up to `-G`) and `coulomb_potential` (up
+    to `1 / (4 π ε_0)`), evaluated `block` rows at a time.
+    """
+    total = 0.0
+    for start in range(0, len(r), block):
+        stop = min(start + block, len(r))
+        d = r[np.newaxis, start:, :] - r[start:stop, np.newaxis, :]
+        distance = np.sqrt(np.einsum("ijk,ijk->ij", d, d))
+        rows = np.arange(stop - start)
+        distance[rows, rows] = np.inf
+        # Only the pairs with `j > i`.
+        total += np.triu(
+            s[start:stop, np.newaxis] * s[np.newaxis, start:] / distance, 1
+        ).sum()
+    return float(total)
+
+
+def lorentz_force(self, field):
+    E, B = field(self.r)
+    return self.q * (E + self.v @ B)
 
 
 def implement_universal_force(universe, force):
-    """This approach is a little quirky when seen with a physics
-    backgroud. However, is it easier to implement this way.
+    """Let `force` act between all bodies that are currently in the
+    universe.
     """
-    for body, other in product(universe.bodies, repeat=2):
-        if body is not other:
-            body.add_force(partial(force, other=other))
+    return universe.add_force(PairForce(force, universe.bodies))
+
+
+def implement_field(universe, field):
+    return universe.add_force(Field(field, universe.bodies))
 
 
 def kinetic_energy(states):
@@ -301,6 +1769,138 @@ def kinetic_energy(states):
     return energy
 
 
+def momentum(states):
+    return sum((state.v * state.m for state in states[1:]),
+               states[0].v * states[0].m)
+
+
+def angular_momentum(states):
+    """Total angular momentum about the origin; a number in 2-D."""
+    if len(states[0].r) == 2:
+        return sum(
+            state.m * (state.r[0] * state.v[1] - state.r[1] * state.v[0])
+            for state in states
+        )
+    return sum((state.m * (state.r @ state.v) for state in states[1:]),
+               states[0].m * (states[0].r @ states[0].v))
+
+
+class ConservationMonitor(object):
+    """Energy, momentum and angular momentum of a universe.
+
+    `universe.add_monitor(monitor)` samples every `interval` steps;
+    `simulate` additionally adapts the step length to a drift budget.
+    The potential energy is summed over `forces` (all forces of the
+    universe by default). Attached `Spring`s are not registered with
+    the universe, so pass them explicitly, e. g. `forces=universe.forces
+    + [spring]`. The energy is only `conserved` when every force has a
+    potential and the bodies have no accelerations of their own except
+    those `attached` by one of the `forces`. A `lorentz_force` field
+    without an electric field where the bodies are does no work, so
+    then the kinetic energy (and `|v|`) is the conserved quantity.
+    """
+
+    Sample = namedtuple(
+        "Sample", "time, kinetic, potential, energy, momentum, "
+        "angular_momentum",
+    )
+
+    def __init__(self, universe, interval=1, forces=None):
+        self.universe = universe
+        self.interval = interval
+        self.forces = forces
+        self.samples = []
+        self.steps = 0
+        self.steplens = []
+
+    @property
+    def conserved(self):
+        universe = self.universe
+        forces = universe.forces if self.forces is None else self.forces
+        accounted = {
+            id(a) for force in forces for a in getattr(force, "attached", ())
+        }
+        return not any(
+            force.dissipative or force.potential_energy(universe) is None
+            for force in forces
+        ) and not any(
+            id(a) not in accounted
+            for body in universe.integrated_bodies(order=2)
+            for a in getattr(body, "accelerations", ())
+        )
+
+    def measure(self, time=None):
+        universe = self.universe
+        forces = universe.forces if self.forces is None else self.forces
+        states = [
+            body.state() for body in universe.integrated_bodies(order=2)
+        ]
+        kinetic = kinetic_energy(states)
+        potential = sum(
+            force.potential_energy(universe) or 0 for force in forces
+        )
+        return self.Sample(
+            universe.time if time is None else time,
+            kinetic,
+            potential,
+            kinetic + potential,
+            momentum(states) if states else None,
+            angular_momentum(states) if states else None,
+        )
+
+    def after_step(self, dt):
+        self.steps += 1
+        if not self.steps % self.interval:
+            # The universe only advances its time after the step.
+            self.samples.append(self.measure(self.universe.time + dt))
+
+    def drift(self, first=None, last=None):
+        """Relative change of the energy between two samples (the
+        first and the last by default).
+        """
+        first = self.samples[0] if first is None else first
+        last = self.samples[-1] if last is None else last
+        scale = abs(first.kinetic) + abs(first.potential) or 1
+        return abs(last.energy - first.energy) / scale
+
+    def simulate(self, end_time, dt, steplen=0.005, budget=1e-4):
+        """Like `Universe.simulate_shortstep`, but the step length is
+        chosen so that the energy changes by at most `budget` (relative)
+        within every `dt`: an interval that exceeds it is repeated with
+        half the step length, and the step length is doubled after an
+        interval well within the budget.
+        """
+        universe = self.universe
+        if not self.conserved:
+            raise ValueError(
+                "the energy is not conserved, so it cannot be used to "
+                "control the step length"
+            )
+        for _ in range(int(end_time // dt)):
+            start = self.measure()
+            header, values = universe.snapshot()
+            while True:
+                steps = max(1, math.ceil(dt / steplen - 1e-9))
+                for _ in range(steps):
+                    universe.step(dt / steps)
+                    universe.time += dt / steps
+                error = self.drift(start, self.measure())
+                if error <= budget or steps > 2 ** 20:
+                    break
+                universe.load_snapshot(header, values)
+                self.samples = [
+                    sample for sample in self.samples
+                    if sample.time <= universe.time
+                ]
+                steplen /= 2
+            self.steplens.append(dt / steps)
+            # Second order integrators get four times more accurate
+            # with half the step length.
+            if error < budget / 8:
+                steplen *= 2
+            yield universe.state()
+
+
 def random_vector(bound, dimension=3):
     return Vector(*[random.uniform(-bound, bound) for _ in range(dimension)])
 
@@ -0,0 +1,776 @@
+"""Structure-of-arrays variant of `jim.Universe`.
+
+Instead of a list of `Body` objects, an `ArrayUniverse` keeps the
+positions, velocities, masses and charges of all bodies in contiguous
+NumPy arrays (one row per body), so a step is a handful of vectorized
+array operations no matter how many bodies there are.
+
+Switching a notebook like `zerfall_animation.ipynb` over takes three
+changes:
+
+    class Universe(ArrayBoxMixin, ArrayRadioactivityMixin, ArrayUniverse):
+        pass
+
+    universe = Universe(size=5, gravity=jim.Vector(0, 0))
+    universe.add_all(bodies)
+    universe.add_force(lambda universe: array_friction(universe) / 10)
+
+- the mixins are `ArrayBoxMixin` and `ArrayRadioactivityMixin` instead
+  of `jim.BoxMixin` and `jim.RadioactivityMixin`;
+- forces are added to the universe, for all bodies at once, instead of
+  `body.add_force(...)` for every body. `jim.implement_field` and
+  `jim.implement_universal_force` work unchanged;
+- bodies are views of rows (`ArrayBody`), so they are only valid until
+  bodies decay.
+"""
+
+import os
+from collections import namedtuple
+
+import numpy as np
+
+import barnes_hut
+import jim
+from cell_list import NeighbourList
+from jim import Body, Vector, describe, inverse_square_field
+
+
+class ArrayBody(object):
+    """A view of one row of an `ArrayUniverse`.
+
+    Views are only valid until bodies are removed from the universe.
+    """
+
+    order = 2
+
+    def __init__(self, universe, index):
+        self.universe = universe
+        self.index = index
+
+    @property
+    def r(self):
+        return Vector(*self.universe.r[self.index].tolist())
+
+    @r.setter
+    def r(self, r):
+        self.universe.r[self.index] = tuple(r)
+
+    @property
+    def v(self):
+        return Vector(*self.universe.v[self.index].tolist())
+
+    @v.setter
+    def v(self, v):
+        self.universe.v[self.index] = tuple(v)
+
+    @property
+    def a(self):
+        return Vector(*self.universe.acceleration()[self.index].tolist())
+
+    @property
+    def m(self):
+        return self.universe.m[self.index]
+
+    @property
+    def q(self):
+        return self.universe.q[self.index]
+
+    @property
+    def λ(self):
+        return self.universe.λ[self.index]
+
+    @property
+    def serial(self):
+        return int(self.universe.serial[self.index])
+
+    def add_acceleration(self, *args, **kwargs):
+        raise TypeError(
+            "bodies of an ArrayUniverse have no accelerations of their "
+            "own; register forces for all bodies with "
+            "ArrayUniverse.add_force, e. g. `universe.add_force(lambda "
+            "universe: array_friction(universe) / 10)`"
+        )
+
+    add_force = add_acceleration
+
+    def state(self):
+        return Body.State(self.r, self.v, self.a, self.m)
+
+    def __repr__(self):
+        return str(self.state())
+
+
+class ArrayUniverse(jim.Universe):
+    """Drop-in replacement for `jim.Universe` for many bodies.
+
+    Forces are registered on the universe instead of on single bodies:
+    `add_acceleration` and `add_force` take a callable that gets the
+    universe and returns an array with one row per body (or a single
+    vector that is broadcast to all bodies). `add_force` also takes the
+    `jim.Force`s registered by `jim.implement_field` and
+    `jim.implement_universal_force`. Bodies with accelerations of their
+    own (`Body.add_force`) cannot be added.
+    """
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        mixins = [
+            (mixin, replacement)
+            for mixin, replacement in JIM_MIXINS.items()
+            if issubclass(cls, mixin)
+        ]
+        if mixins:
+            raise TypeError(
+                "the mixins of jim work on lists of bodies; use {} "
+                "instead of {} with an ArrayUniverse".format(
+                    ", ".join(replacement for _, replacement in mixins),
+                    ", ".join("jim." + mixin.__name__ for mixin, _ in mixins),
+                )
+            )
+
+    def __init__(self, gravity, start_time=0, seed=None):
+        # `jim.Universe.__init__` is not called because `bodies` is
+        # a read only view here.
+        self.gravity = np.array(tuple(gravity), dtype=float)
+        self.epoch = 0
+        self.time = start_time
+        self.dimension = len(self.gravity)
+        self.rng = np.random.default_rng(seed)
+        self.accelerations = []
+        self.r = np.empty((0, self.dimension))
+        self.v = np.empty((0, self.dimension))
+        self.m = np.empty(0)
+        self.q = np.empty(0)
+        self.λ = np.empty(0)
+        # Like `Body.serial`: identifies a body even after other bodies
+        # were removed.
+        self.serial = np.empty(0, dtype=np.int64)
+        self.added = 0
+
+    def __iter__(self):
+        return (ArrayBody(self, index) for index in range(len(self)))
+
+    def __len__(self):
+        return len(self.m)
+
+    @property
+    def bodies(self):
+        return list(self)
+
+    def add(self, body):
+        self.add_all([body])
+
+    def add_all(self, bodies):
+        bodies = list(bodies)
+        if not bodies:
+            return
+        for body in bodies:
+            if getattr(body, "order", 1) != 2:
+                raise TypeError(
+                    "{} does not follow `r'' = a` and cannot be added to "
+                    "an ArrayUniverse".format(type(body).__name__)
+                )
+            if getattr(body, "accelerations", None):
+                raise ValueError(
+                    "{!r} has accelerations of its own, which an "
+                    "ArrayUniverse would ignore; register them with "
+                    "ArrayUniverse.add_force instead".format(body)
+                )
+        self.r = np.concatenate(
+            [self.r, [tuple(body.r) for body in bodies]]
+        )
+        self.v = np.concatenate(
+            [self.v, [tuple(body.v) for body in bodies]]
+        )
+        self.m = np.concatenate([self.m, [body.m for body in bodies]])
+        self.q = np.concatenate(
+            [self.q, [getattr(body, "q", 0) for body in bodies]]
+        )
+        self.λ = np.concatenate(
+            [self.λ, [getattr(body, "λ", 0) for body in bodies]]
+        )
+        self.serial = np.concatenate([
+            self.serial, np.arange(self.added + 1, self.added + len(bodies) + 1)
+        ])
+        self.added += len(bodies)
+
+    def remove(self, mask):
+        """Remove all bodies for which `mask` is true."""
+        keep = ~np.asarray(mask, dtype=bool)
+        self.r = self.r[keep]
+        self.v = self.v[keep]
+        self.m = self.m[keep]
+        self.q = self.q[keep]
+        self.λ = self.λ[keep]
+        self.serial = self.serial[keep]
+
+    def add_acceleration(self, a):
+        self.accelerations.append(a)
+
+    def add_force(self, force):
+        if isinstance(force, jim.Force):
+            return self._add_universe_force(force)
+        self.add_acceleration(
+            lambda universe: force(universe) / universe.m[:, np.newaxis]
+        )
+
+    def _add_universe_force(self, force):
+        if force.bodies is not None and len(force.bodies) != len(self):
+            raise ValueError(
+                "forces of an ArrayUniverse act on all bodies, but {!r} "
+                "does not".format(force)
+            )
+        if isinstance(force, jim.PairForce) and (
+                force.force in PAIR_ACCELERATIONS):
+            self.add_acceleration(BatchedPairForce(force.force))
+        elif isinstance(force, jim.Field) and force.force in ARRAY_FIELDS:
+            self.add_force(ARRAY_FIELDS[force.force])
+        elif force.coupled:
+            raise TypeError("no batched kernel for {!r}".format(force))
+        else:
+            self.add_acceleration(ForceAcceleration(force))
+        return force
+
+    def acceleration(self):
+        a = np.zeros_like(self.r)
+        a += self.gravity
+        for accelerate in self.accelerations:
+            a += accelerate(self)
+        return a
+
+    def step(self, dt):
+        # Same order as `Body.move`: the acceleration is evaluated at
+        # the new position and the old velocity.
+        self.r += self.v * dt
+        self.v += self.acceleration() * dt
+
+    def snapshot(self):
+        header = self._snapshot_header()
+        header["dimension"] = self.dimension
+        header["added"] = self.added
+        values = np.concatenate([
+            self.r.ravel(), self.v.ravel(), self.m, self.q, self.λ,
+            self.serial,
+        ])
+        return header, values.tolist()
+
+    def _snapshot_header(self, removed=()):
+        return {
+            "universe": type(self).__name__,
+            "time": self.time,
+            "gravity": self.gravity.tolist(),
+            "size": getattr(self, "size", None),
+            "forces": [describe(accelerate) for accelerate in self.accelerations],
+            "random": self.rng.bit_generator.state,
+        }
+
+    def load_snapshot(self, header, values):
+        self._check_snapshot_header(header, ("universe", "size", "forces"))
+        values = np.array(values)
+        n = len(values) // (2 * header["dimension"] + 4)
+        vectors = n * header["dimension"]
+        self.r = values[:vectors].reshape(n, -1)
+        self.v = values[vectors:2 * vectors].reshape(n, -1)
+        self.m, self.q, self.λ, serial = (
+            values[2 * vectors:].reshape(4, n).copy()
+        )
+        self.serial = serial.astype(np.int64)
+        self.added = header["added"]
+        self.rng.bit_generator.state = header["random"]
+        self.time = header["time"]
+
+    def state(self):
+        return [
+            Body.State(Vector(*r), Vector(*v), Vector(*a), m)
+            for r, v, a, m in zip(
+                self.r.tolist(),
+                self.v.tolist(),
+                self.acceleration().tolist(),
+                self.m.tolist(),
+            )
+        ]
+
+
+class ForceAcceleration(object):
+    """A `jim.Force` without a vectorized kernel, evaluated body by
+    body."""
+
+    def __init__(self, force):
+        self.force = force
+
+    def __call__(self, universe):
+        return np.array([
+            tuple(self.force.acceleration(universe, body))
+            for body in universe
+        ]).reshape(len(universe), universe.dimension)
+
+    def __repr__(self):
+        return "ForceAcceleration({!r})".format(self.force)
+
+
+# The mixins of `jim` and their replacements for an `ArrayUniverse`.
+JIM_MIXINS = {
+    jim.BoxMixin: "ArrayBoxMixin",
+    jim.RadioactivityMixin: "ArrayRadioactivityMixin",
+}
+
+
+class ArrayRadioactivityMixin:
+    def step(self, dt):
+        super().step(dt)
+        self.do_decays(dt)
+
+    def do_decays(self, dt):
+        survival = np.exp(-self.λ * dt)
+        self.remove(
+            (self.λ > 0) & (self.rng.random(len(self)) > survival)
+        )
+
+
+class ArrayBoxMixin:
+    def __init__(self, size, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.size = size
+
+    def step(self, dt):
+        super().step(dt)
+        self.check_box()
+
+    def check_box(self):
+        outside = (np.abs(self.r) > self.size) & (self.r * self.v > 0)
+        self.v[outside] *= -1
+
+
+def array_friction(universe):
+    """Vectorized version of `jim.friction`."""
+    speed = np.linalg.norm(universe.v, axis=1)[:, np.newaxis]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        unit = np.where(speed > 0, universe.v / speed, 0)
+    return np.where(
+        speed < 0.7,
+        -universe.v / 0.7,
+        np.where(speed < 1, -unit, -universe.v),
+    )
+
+
+# Vectorized versions of fields for `jim.implement_field`.
+ARRAY_FIELDS = {
+    jim.friction: array_friction,
+}
+
+
+def gravitational_acceleration(universe, field):
+    return jim.G * field(universe.r, universe.m)
+
+
+def coulomb_acceleration(universe, field):
+    coupling = -universe.q / (4 * jim.π * jim.ε_0 * universe.m)
+    return coupling[:, np.newaxis] * field(universe.r, universe.q)
+
+
+PAIR_ACCELERATIONS = {
+    jim.gravitate: gravitational_acceleration,
+    jim.coulomb_force: coulomb_acceleration,
+}
+
+FIELD_METHODS = {
+    "exact": inverse_square_field,
+    "barnes-hut": barnes_hut.field,
+}
+
+
+class BatchedPairForce(object):
+    """All pairwise interactions of a universal force in one pass.
+
+    `force` is `jim.gravitate` or `jim.coulomb_force`; `method` selects
+    how the underlying inverse square field is computed and `options`
+    are passed on to that method.
+    """
+
+    def __init__(self, force, method="exact", **options):
+        try:
+            self.accelerate = PAIR_ACCELERATIONS[force]
+        except KeyError:
+            raise ValueError(
+                "no batched kernel for {!r}".format(force)
+            ) from None
+        self.force = force
+        self.method = method
+        self.options = options
+        self.field_method = FIELD_METHODS[method]
+
+    def field(self, r, s):
+        return self.field_method(r, s, **self.options)
+
+    def __call__(self, universe):
+        return self.accelerate(universe, self.field)
+
+    def force_error(self, universe, sample=1000):
+        """Error of the Barnes–Hut field against the exact kernel."""
+        options = dict(self.options)
+        if self.method == "exact":
+            options["θ"] = 0
+        source = universe.m if self.force is jim.gravitate else universe.q
+        return barnes_hut.force_error(
+            universe.r, source, sample=sample, **options
+        )
+
+    def __repr__(self):
+        return "BatchedPairForce({}, method={!r})".format(
+            self.force.__name__, self.method
+        )
+
+
+def implement_batched_force(universe, force, method="exact", **options):
+    """Like `jim.implement_universal_force`, but with a choice of the
+    `method` of the `BatchedPairForce`.
+    """
+    pairs = BatchedPairForce(force, method, **options)
+    universe.add_acceleration(pairs)
+    return pairs
+
+
+class ShortRangeForce(object):
+    """A pair force that vanishes beyond a cutoff radius.
+
+    `force(universe, i, j, d, distance)` gets arrays of pairs closer
+    than the cutoff, with `d = r[j] - r[i]`, and returns the force on
+    `i`; `j` gets the opposite force. The cutoff is taken from
+    `force.cutoff` unless it is given explicitly. Pairs are found with
+    a `NeighbourList` whose grid is sized from `universe.size` when the
+    universe has a box.
+    """
+
+    def __init__(self, force, cutoff=None, skin=None):
+        self.force = force
+        self.cutoff = force.cutoff if cutoff is None else cutoff
+        self.neighbours = NeighbourList(self.cutoff, skin)
+
+    def __call__(self, universe):
+        i, j = self.neighbours.pairs(
+            universe.r, getattr(universe, "size", None)
+        )
+        d = universe.r[j] - universe.r[i]
+        distance = np.sqrt(np.einsum("ij,ij->i", d, d))
+        close = distance < self.cutoff
+        i, j, d, distance = i[close], j[close], d[close], distance[close]
+        f = self.force(universe, i, j, d, distance)
+        total = np.zeros_like(universe.r)
+        for axis in range(universe.dimension):
+            total[:, axis] += np.bincount(
+                i, f[:, axis], minlength=len(universe)
+            )
+            total[:, axis] -= np.bincount(
+                j, f[:, axis], minlength=len(universe)
+            )
+        return total / universe.m[:, np.newaxis]
+
+
+def soft_sphere(stiffness, diameter):
+    """Harmonic repulsion of spheres that overlap."""
+    def force(universe, i, j, d, distance):
+        return (-stiffness * (diameter - distance) / distance)[:, None] * d
+    force.cutoff = diameter
+    return force
+
+
+class BodyColumns(object):
+    """Gives every body a stable column by its `serial` when it is
+    first seen (`columns` maps serials to columns), because removing
+    bodies changes the order of the remaining ones. At most `bodies`
+    columns are given out (any number if it is `None`).
+    """
+
+    bodies = None
+
+    def _serials(self, universe):
+        if isinstance(universe, ArrayUniverse):
+            return universe.serial.tolist()
+        if isinstance(universe, FieldUniverse):
+            # Bodies of a `FieldUniverse` are never removed.
+            return list(range(len(universe)))
+        # Bodies that were not added with `Universe.add` have no serial.
+        return [getattr(body, "serial", None) or id(body) for body in universe]
+
+    def _columns(self, universe):
+        serials = self._serials(universe)
+        if self._order is not None and self._order[0] == serials:
+            return self._order[1]
+        columns = []
+        for serial in serials:
+            column = self.columns.get(serial)
+            if column is None:
+                if len(self.columns) == self.bodies:
+                    raise IndexError("no column left for another body")
+                column = self.columns[serial] = len(self.columns)
+            columns.append(column)
+        columns = np.array(columns, dtype=np.int64)
+        self._order = serials, columns
+        return columns
+
+
+class Recorder(BodyColumns):
+    """Records a simulation into preallocated arrays.
+
+    Every field (`"r"`, `"v"`, `"a"`, `"m"`, ...) gets an array of shape
+    `(frames, bodies, dimension)` for vectors or `(frames, bodies)` for
+    scalars, and `time` holds the time of every frame. The arrays are
+    allocated on the first recorded frame, filled with NaN so that
+    bodies which decayed are easy to spot. With a `path`, they are
+    memory-mapped `.npy` files in that directory instead, so runs can
+    be longer than the memory.
+
+    Every body gets its column by its `serial` (see `BodyColumns`).
+    `bodies` is the number of bodies that are ever recorded, including
+    those added later.
+    """
+
+    def __init__(self, frames, bodies, fields=("r", "v"), path=None):
+        self.capacity = frames
+        self.bodies = bodies
+        self.fields = fields
+        self.path = path
+        self.frames = 0
+        self.arrays = None
+        self.columns = {}
+        self._order = None
+
+    def _allocate(self, name, shape):
+        if self.path is None:
+            return np.full(shape, np.nan)
+        os.makedirs(self.path, exist_ok=True)
+        array = np.lib.format.open_memmap(
+            os.path.join(self.path, name + ".npy"),
+            mode="w+", dtype=float, shape=shape,
+        )
+        array[:] = np.nan
+        return array
+
+    def _values(self, universe, field):
+        if isinstance(universe, (ArrayUniverse, FieldUniverse)):
+            if field == "a":
+                return universe.acceleration()
+            return getattr(universe, field)
+        return np.array([
+            tuple(value) if isinstance(value, Vector) else value
+            for value in (getattr(body, field) for body in universe)
+        ])
+
+    def record(self, universe):
+        """Record the current state of `universe` as the next frame."""
+        if self.frames == self.capacity:
+            raise IndexError("recorder is full")
+        columns = self._columns(universe)
+        values = {
+            field: self._values(universe, field) for field in self.fields
+        }
+        if self.arrays is None:
+            self.arrays = {
+                field: self._allocate(
+                    field, (self.capacity, self.bodies) + value.shape[1:]
+                )
+                for field, value in values.items()
+            }
+            self.time = self._allocate("time", (self.capacity,))
+        for field, value in values.items():
+            if len(value):
+                self.arrays[field][self.frames, columns] = value
+        self.time[self.frames] = universe.time
+        self.frames += 1
+
+    def simulate(self, universe, end_time, dt, steplen=None):
+        """Run `universe` like `Universe.simulate` (or, with `steplen`,
+        `simulate_shortstep`) and record every frame, without building
+        `State` objects.
+        """
+        self.record(universe)
+        for _ in range(int(end_time // dt)):
+            if steplen is None:
+                universe.step(dt)
+                universe.time += dt
+            else:
+                for _ in range(int(dt // steplen)):
+                    universe.step(steplen)
+                    universe.time += steplen
+            self.record(universe)
+        return self
+
+    def __getitem__(self, field):
+        if field == "time":
+            return self.time[:self.frames]
+        return self.arrays[field][:self.frames]
+
+    def flush(self):
+        if self.path is not None and self.arrays is not None:
+            for array in self.arrays.values():
+                array.flush()
+            self.time.flush()
+
+
+class TraceHistory(BodyColumns):
+    """Append-only history of one state field for animations.
+
+    Samples are stored in an array of shape `(samples, bodies,
+    dimension)` whose capacity doubles when it is full, so appending is
+    amortized O(1). `upto`, `tail` and `trace` return views, so drawing
+    a frame does not depend on the length of the history.
+
+    Samples appended with their `universe` are stored in the columns of
+    the bodies’ serials (see `BodyColumns`), so the traces of bodies
+    stay in their columns when other bodies are removed; the column of
+    a body is `columns[body.serial]`. Without the universe, the `i`-th
+    state goes into column `i`. Missing bodies are NaN.
+    """
+
+    def __init__(self, field="r", capacity=64):
+        self.field = field
+        self.capacity = capacity
+        self.length = 0
+        self.columns = {}
+        self._order = None
+        self._data = None
+
+    def _reserve(self, bodies, shape):
+        """Make room for one more sample with `bodies` columns."""
+        data = self._data
+        samples = self.capacity if data is None else len(data)
+        while samples <= self.length:
+            samples *= 2
+        if data is not None:
+            bodies = max(bodies, data.shape[1])
+            if samples == len(data) and bodies == data.shape[1]:
+                return
+        grown = np.full((samples, bodies) + shape, np.nan)
+        if data is not None:
+            grown[:self.length, :data.shape[1]] = data[:self.length]
+        self._data = grown
+
+    def append(self, values, universe=None):
+        """Append one sample: a list of states or an array with one row
+        per body, of the current bodies of `universe` if it is given.
+        """
+        if not isinstance(values, np.ndarray):
+            values = np.array(
+                [tuple(getattr(state, self.field)) for state in values]
+            )
+        if len(values):
+            if universe is None:
+                columns = slice(0, len(values))
+                bodies = len(values)
+            else:
+                columns = self._columns(universe)
+                bodies = len(self.columns)
+            self._reserve(bodies, values.shape[1:])
+            self._data[self.length, columns] = values
+        elif self._data is not None:
+            # A sample without bodies stays NaN; before the first body
+            # the shape is not known yet, and `_reserve` fills the
+            # skipped samples with NaN later.
+            self._reserve(0, self._data.shape[2:])
+        self.length += 1
+
+    def feed(self, states, universe=None):
+        """Pass the states of a simulation of `universe` through,
+        recording them.
+        """
+        for state in states:
+            self.append(state, universe)
+            yield state
+
+    def __len__(self):
+        return self.length
+
+    def upto(self, i):
+        """The first `i` samples."""
+        return self._data[:min(i, self.length)]
+
+    def tail(self, k, end=None):
+        """The last `k` samples before `end` (by default all samples)."""
+        end = self.length if end is None else min(end, self.length)
+        return self._data[max(0, end - k):end]
+
+    def trace(self, body, i=None, k=None):
+        """Coordinates of `body` as an array of shape `(dimension,
+        samples)`, ready for `set_data`: the first `i` samples or, with
+        `k`, the last `k` of them.
+        """
+        i = self.length if i is None else i
+        samples = self.upto(i) if k is None else self.tail(k, i)
+        return samples[:, body].T
+
+
+class FieldUniverse(jim.Universe):
+    """A universe of bodies that follow a velocity field, `r' = v`.
+
+    Instead of a `v` property on every body (like `LorenzBody`), the
+    velocities of all bodies are given by one vectorized right hand
+    side `rhs(t, X, params)`, where `X` has one row per body, and the
+    whole ensemble is integrated as one array.
+    """
+
+    State = namedtuple("FieldBodyState", "r, v")
+
+    def __init__(self, rhs, params=(), dimension=3, start_time=0,
+                 integrator="rk4"):
+        self.rhs = rhs
+        self.params = params
+        self.dimension = dimension
+        self.epoch = 0
+        self.time = start_time
+        self.integrator = integrator
+        self.r = np.empty((0, dimension))
+
+    def __iter__(self):
+        return iter(self.state())
+
+    def __len__(self):
+        return len(self.r)
+
+    @property
+    def bodies(self):
+        return self.state()
+
+    def add(self, body):
+        self.add_all([body])
+
+    def add_all(self, bodies):
+        self.add_positions([tuple(body.r) for body in bodies])
+
+    def add_positions(self, r):
+        r = np.asarray(r, dtype=float).reshape(-1, self.dimension)
+        self.r = np.concatenate([self.r, r])
+
+    @property
+    def v(self):
+        return self.rhs(self.time, self.r, self.params)
+
+    def step(self, dt):
+        # `rhs` gets the parameters positionally, like in `v`, so that
+        # any name of the third argument works.
+        rhs, params = self.rhs, self.params
+        t, r = self.time, self.r
+        if self.integrator == "euler":
+            self.r = r + dt * rhs(t, r, params)
+        elif self.integrator == "rk4":
+            k1 = rhs(t, r, params)
+            k2 = rhs(t + dt / 2, r + dt / 2 * k1, params)
+            k3 = rhs(t + dt / 2, r + dt / 2 * k2, params)
+            k4 = rhs(t + dt, r + dt * k3, params)
+            self.r = r + dt / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
+        else:
+            raise ValueError(
+                "unknown integrator {!r}".format(self.integrator)
+            )
+
+    def state(self):
+        return [
+            self.State(Vector(*r), Vector(*v))
+            for r, v in zip(self.r.tolist(), self.v.tolist())
+        ]
+
+
+def lorenz(t, X, params):
+    """Right hand side of the Lorenz attractor for `FieldUniverse`."""
+    a, b, c = params
+    x, y, z = X.T
+    return np.stack([a * (y - x), x * (b - z) - y, x * y - c * z], axis=1)
@@ -0,0 +1,204 @@
+"""Switchable instrumentation of `Universe.step`.
+
+A `Profiler` wraps the methods of one universe instance (and of its
+forces) while it is enabled, so an uninstrumented universe runs the
+plain methods without any overhead. It records the wall time of every
+phase, the force evaluations, the removed bodies and the change of
+`sys.getallocatedblocks()` of every step, and exports a summary table
+or a trace in the Chrome trace event format (load it in
+`chrome://tracing` or Perfetto).
+
+    with Profiler(universe) as profiler:
+        exhaust(universe.simulate(1, 0.01))
+    print(profiler.summary())
+    profiler.write_trace("trace.json")
+"""
+
+import json
+import os
+import sys
+import time
+from collections import defaultdict, namedtuple
+
+
+PHASES = (
+    "state", "snapshot", "compute_accelerations", "kick", "drift",
+    "move_kinematic", "check_box", "do_decays",
+)
+
+Step = namedtuple(
+    "Step", "start, duration, evaluations, removed, allocated_blocks"
+)
+
+
+class Profiler(object):
+    def __init__(self, universe, phases=PHASES, forces=True):
+        self.universe = universe
+        self.phases = phases
+        self.profile_forces = forces
+        self.events = []
+        self.steps = []
+        self.totals = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.enabled = False
+        self._wrapped_forces = []
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.disable()
+
+    def _clock(self):
+        return time.perf_counter()
+
+    def _timed(self, name, function):
+        def timed(*args, **kwargs):
+            start = self._clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self._record(name, start, self._clock())
+        return timed
+
+    def _record(self, name, start, end):
+        self.totals[name] += end - start
+        self.calls[name] += 1
+        self.events.append((name, start, end))
+
+    def enable(self):
+        if self.enabled:
+            return
+        universe = self.universe
+        self._start = self._clock()
+        for name in self.phases:
+            if hasattr(universe, name):
+                setattr(universe, name,
+                        self._timed(name, getattr(universe, name)))
+        # `ArrayUniverse` has no integrator, and the one of a
+        # `FieldUniverse` is the name of a method.
+        self._integrator = getattr(universe, "integrator", None)
+        if callable(self._integrator):
+            universe.integrator = self._timed("integrator", self._integrator)
+        step = universe.step
+
+        def profiled_step(dt):
+            bodies = len(universe.bodies)
+            evaluations = self._evaluations()
+            blocks = sys.getallocatedblocks()
+            start = self._clock()
+            try:
+                return step(dt)
+            finally:
+                end = self._clock()
+                self._record("step", start, end)
+                self.steps.append(Step(
+                    start,
+                    end - start,
+                    self._evaluations() - evaluations,
+                    max(0, bodies - len(universe.bodies)),
+                    sys.getallocatedblocks() - blocks,
+                ))
+        universe.step = profiled_step
+
+        if self.profile_forces:
+            for force in getattr(universe, "forces", ()):
+                name = "force {!r}".format(force)
+                for method in ("accumulate", "acceleration"):
+                    setattr(force, method, self._timed(
+                        "{}.{}".format(name, method), getattr(force, method)
+                    ))
+                self._wrapped_forces.append(force)
+        self.enabled = True
+
+    def disable(self):
+        """Remove all wrappers again."""
+        if not self.enabled:
+            return
+        universe = self.universe
+        for name in self.phases + ("step",):
+            vars(universe).pop(name, None)
+        if callable(self._integrator):
+            universe.integrator = self._integrator
+        for force in self._wrapped_forces:
+            vars(force).pop("accumulate", None)
+            vars(force).pop("acceleration", None)
+        self._wrapped_forces = []
+        self.enabled = False
+
+    def _evaluations(self):
+        return sum(
+            getattr(force, "evaluations", 0)
+            for force in getattr(self.universe, "forces", ())
+        )
+
+    def summary(self):
+        """A table of the total and mean time of every phase, followed
+        by the per-step counters.
+        """
+        step_time = self.totals.get("step") or 1
+        rows = [
+            ("phase", "calls", "total [s]", "mean [µs]", "% of step time"),
+        ]
+        for name, total in sorted(
+                self.totals.items(), key=lambda item: -item[1]):
+            calls = self.calls[name]
+            rows.append((
+                name,
+                str(calls),
+                "{:.6f}".format(total),
+                "{:.1f}".format(total / calls * 1e6),
+                "{:.1f}".format(100 * total / step_time),
+            ))
+        widths = [max(len(row[i]) for row in rows) for i in range(5)]
+        lines = [
+            "  ".join(
+                cell.ljust(width) if i == 0 else cell.rjust(width)
+                for i, (cell, width) in enumerate(zip(row, widths))
+            )
+            for row in rows
+        ]
+        steps = len(self.steps) or 1
+        lines.append("")
+        lines.append("steps: {}".format(len(self.steps)))
+        lines.append("force evaluations per step: {:.1f}".format(
+            sum(step.evaluations for step in self.steps) / steps
+        ))
+        lines.append("bodies removed: {}".format(
+            sum(step.removed for step in self.steps)
+        ))
+        lines.append("allocated blocks per step: {:+.1f}".format(
+            sum(step.allocated_blocks for step in self.steps) / steps
+        ))
+        return "\n".join(lines)
+
+    def trace(self):
+        """The recorded phases and counters as Chrome trace events."""
+        pid = os.getpid()
+
+        def microseconds(seconds):
+            return (seconds - self._start) * 1e6
+
+        events = [
+            {
+                "name": name, "ph": "X", "pid": pid, "tid": 0,
+                "ts": microseconds(start), "dur": (end - start) * 1e6,
+            }
+            for name, start, end in self.events
+        ]
+        for step in self.steps:
+            events.append({
+                "name": "step counters", "ph": "C", "pid": pid, "tid": 0,
+                "ts": microseconds(step.start),
+                "args": {
+                    "evaluations": step.evaluations,
+                    "removed": step.removed,
+                    "allocated_blocks": step.allocated_blocks,
+                },
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_trace(self, path):
+        with open(path, "w") as file:
+            json.dump(self.trace(), file)
@@ -0,0 +1,206 @@
+"""Render recorded simulations to videos in parallel.
+
+The notebooks simulate inside of `FuncAnimation`’s `animate(i)`, so the
+physics, the rasterization and `ani.save(..., libx264)` all run one
+after another in one process. Here the simulation is run once into a
+`Recorder`, and the frames are drawn in chunks by a pool of processes
+with the Agg backend. The raw RGBA frames are written in order into the
+stdin of a single ffmpeg process.
+
+    recorder = Recorder(901, 3, path="lorenz").simulate(universe, 30, 1/30)
+    render(recorder, setup_lorenz, "lorenz_attractor.mp4", fps=30)
+
+`setup(figure, trajectory)` is called once in every worker with an
+empty Agg figure and the recorded arrays (`trajectory["r"]`,
+`trajectory["time"]`, ...) and returns `draw(i)`, which sets the
+artists to frame `i`. Like `animate(i)`, `draw` has to draw the whole
+frame from the trajectory, because the workers get the frames in
+chunks and never see the frames of the other chunks. `setup` has to be
+a module-level function, so that it can be sent to the workers.
+
+At most `window` chunks are rendered or waiting to be written at any
+time, so the memory is bounded by `window * chunk` frames no matter how
+long the video is.
+"""
+
+import itertools
+import os
+import subprocess
+from collections import deque
+from multiprocessing import Pool
+
+import numpy as np
+
+from jim_array import Recorder
+
+
+def chunks(frames, size):
+    """Consecutive `range`s of at most `size` of the `frames` indices."""
+    return [
+        range(start, min(start + size, frames))
+        for start in range(0, frames, size)
+    ]
+
+
+def ordered_map(pool, function, tasks, window):
+    """Like `pool.imap(function, tasks)`, but with at most `window`
+    tasks submitted and not yet consumed.
+
+    `imap` submits all tasks at once and keeps every result until it is
+    consumed, so a slow consumer (the encoder) lets the results pile up.
+    """
+    pending = deque()
+    tasks = iter(tasks)
+    for task in itertools.islice(tasks, window):
+        pending.append(pool.apply_async(function, (task,)))
+    while pending:
+        result = pending.popleft().get()
+        for task in itertools.islice(tasks, 1):
+            pending.append(pool.apply_async(function, (task,)))
+        yield result
+
+
+def _source(trajectory):
+    """What a worker needs to open `trajectory`: the directory of a
+    memory-mapped `Recorder` (so that the arrays are not copied into
+    every process) or the arrays themselves.
+    """
+    if isinstance(trajectory, Recorder):
+        if trajectory.path is not None:
+            trajectory.flush()
+            return trajectory.path, trajectory.frames
+        trajectory = {
+            field: trajectory[field]
+            for field in list(trajectory.fields) + ["time"]
+        }
+    if isinstance(trajectory, str):
+        return trajectory, None
+    return dict(trajectory), None
+
+
+def open_trajectory(source, frames=None):
+    """The arrays of a trajectory: a dict of arrays, or a directory of
+    `.npy` files written by a `Recorder` (memory-mapped, and cut to the
+    first `frames` frames).
+    """
+    if not isinstance(source, str):
+        return source
+    return {
+        name[:-len(".npy")]: np.load(
+            os.path.join(source, name), mmap_mode="r"
+        )[:frames]
+        for name in sorted(os.listdir(source))
+        if name.endswith(".npy")
+    }
+
+
+def frame_count(trajectory):
+    if "time" in trajectory:
+        return len(trajectory["time"])
+    return len(next(iter(trajectory.values())))
+
+
+_worker = None
+
+
+class FrameRenderer(object):
+    """One Agg figure and the `draw` function returned by `setup`."""
+
+    def __init__(self, source, setup, width, height, dpi):
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        self.figure = Figure(figsize=(width / dpi, height / dpi), dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.size = width * height * 4
+        self.draw = setup(self.figure, open_trajectory(*source))
+
+    def render(self, frames):
+        """The RGBA bytes of `frames`, concatenated."""
+        data = []
+        for i in frames:
+            self.draw(i)
+            self.canvas.draw()
+            frame = bytes(self.canvas.buffer_rgba())
+            if len(frame) != self.size:
+                raise ValueError(
+                    "frame {} has {} bytes instead of {}; was the figure "
+                    "resized?".format(i, len(frame), self.size)
+                )
+            data.append(frame)
+        return b"".join(data)
+
+
+def _start_worker(*args):
+    global _worker
+    _worker = FrameRenderer(*args)
+
+
+def _render_chunk(frames):
+    return _worker.render(frames)
+
+
+def render_chunks(
+        trajectory, setup, width=1280, height=720, dpi=100, processes=None,
+        chunk=8, window=None, frames=None):
+    """The RGBA bytes of the chunks of `frames` (by default all
+    recorded frames), in order. With `processes=1` everything is drawn
+    in this process.
+    """
+    source = _source(trajectory)
+    if frames is None:
+        frames = frame_count(open_trajectory(*source))
+    tasks = chunks(frames, chunk)
+    arguments = (source, setup, width, height, dpi)
+    if processes == 1:
+        renderer = FrameRenderer(*arguments)
+        for task in tasks:
+            yield renderer.render(task)
+        return
+    if window is None:
+        window = 2 * (processes or os.cpu_count() or 1)
+    with Pool(processes, _start_worker, arguments) as pool:
+        yield from ordered_map(pool, _render_chunk, tasks, window)
+
+
+def ffmpeg_command(
+        path, width, height, fps=30, codec="libx264", extra_args=(),
+        ffmpeg="ffmpeg"):
+    return [
+        ffmpeg, "-y", "-loglevel", "error",
+        "-f", "rawvideo", "-pix_fmt", "rgba",
+        "-s", "{}x{}".format(width, height), "-r", str(fps),
+        "-i", "-",
+        "-vcodec", codec, "-pix_fmt", "yuv420p",
+        *extra_args,
+        path,
+    ]
+
+
+def render(
+        trajectory, setup, path, fps=30, width=1280, height=720, dpi=100,
+        processes=None, chunk=8, window=None, frames=None, codec="libx264",
+        extra_args=(), ffmpeg="ffmpeg"):
+    """Render `trajectory` (a `Recorder`, a directory written by one,
+    or a dict of arrays) with `setup` into the video file `path`.
+
+    `width` and `height` are in pixels and should be even for
+    `yuv420p`. Returns the number of frames.
+    """
+    encoder = subprocess.Popen(
+        ffmpeg_command(path, width, height, fps, codec, extra_args, ffmpeg),
+        stdin=subprocess.PIPE,
+    )
+    written = 0
+    try:
+        for data in render_chunks(
+                trajectory, setup, width, height, dpi, processes, chunk,
+                window, frames):
+            encoder.stdin.write(data)
+            written += len(data) // (width * height * 4)
+    finally:
+        encoder.stdin.close()
+        returncode = encoder.wait()
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, encoder.args)
+    return written
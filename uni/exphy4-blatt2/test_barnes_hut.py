@@ -0,0 +1,16 @@
+import numpy as np
+
+from barnes_hut import *
+from jim_array import inverse_square_field
+
+
+def test_barnes_hut_converges_to_exact_field():
+    rng = np.random.default_rng(1)
+    for dimension in (2, 3):
+        r = rng.normal(size=(500, dimension))
+        q = rng.choice([-1.0, 1.0], size=500)
+        exact = inverse_square_field(r, q)
+        assert np.allclose(field(r, q, θ=0), exact)
+        errors = [force_error(r, q, θ)["rms"] for θ in (0.2, 0.5, 1)]
+        assert errors == sorted(errors)
+        assert errors[1] < 0.01
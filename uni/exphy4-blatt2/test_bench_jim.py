@@ -0,0 +1,24 @@
+import json
+
+import bench_jim
+
+
+def test_benchmark_report(tmp_path):
+    output = str(tmp_path / "results.json")
+    bench_jim.main(["--quick", "--repeat", "1", "-k", "body_a", "-o", output])
+    with open(output) as file:
+        report = json.load(file)
+    result, = report["results"]
+    assert result["name"] == "body_a"
+    assert 0 < result["best"] <= result["median"]
+    assert bench_jim.compare(report, report) == [
+        "{:<50} {:8.3f}".format("name=body_a", 1)
+    ]
+
+
+def test_scaling_benchmarks_stop_and_are_keyed_by_method():
+    report = bench_jim.run(["pair_field"], quick=True, repeat=1,
+                           max_seconds=0)
+    assert [(result["method"], result["n"]) for result in report["results"]] \
+        == [("exact", 10), ("barnes-hut", 10)]
+    assert len(bench_jim.compare(report, report)) == 2
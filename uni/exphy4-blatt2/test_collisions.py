@@ -0,0 +1,91 @@
+import numpy as np
+
+from jim import *
+from collisions import *
+
+
+def test_head_on_collision():
+    spheres = HardSpheres(
+        [(-2, 0), (2, 0)], [(1, 0), (-1, 0)], 0.5, [1, 1], size=10
+    )
+    spheres.advance(2)
+    assert spheres.collisions == 1
+    assert np.allclose(spheres.v, [(-1, 0), (1, 0)])
+    assert np.allclose(spheres.r, [(-1, 0), (1, 0)])
+
+    spheres = HardSpheres(
+        [(-2, 0), (2, 0)], [(1, 0), (-1, 0)], 0.5, [1, 1], size=10,
+        restitution=0.5,
+    )
+    spheres.advance(2)
+    assert np.allclose(spheres.v, [(-0.5, 0), (0.5, 0)])
+
+
+def test_gas_conserves_energy_and_never_overlaps():
+    rng = np.random.default_rng(0)
+    # Discs on a grid, so that none overlap initially.
+    r = np.stack(np.meshgrid(np.arange(-9, 10), np.arange(-9, 10)), -1)
+    r = r.reshape(-1, 2) + rng.uniform(-0.1, 0.1, (19 * 19, 2))
+    v = rng.normal(size=r.shape)
+    m = rng.uniform(1, 2, len(r))
+    spheres = HardSpheres(r, v, 0.3, m, size=10)
+    energy = (m * (v ** 2).sum(axis=1)).sum()
+    spheres.advance(5)
+    assert spheres.collisions > 100 and spheres.crossings > 100
+    assert np.isclose((m * (spheres.v ** 2).sum(axis=1)).sum(), energy)
+    assert np.all(np.abs(spheres.r) <= 10 - 0.3 + 1e-9)
+    d = spheres.r[:, None] - spheres.r[None]
+    distance = np.sqrt((d ** 2).sum(axis=2))
+    np.fill_diagonal(distance, np.inf)
+    assert distance.min() > 0.6 - 1e-9
+
+
+def test_hard_sphere_integrator():
+    class BoxUniverse(BoxMixin, RadioactivityMixin, Universe):
+        pass
+    collisions = HardSphereCollisions()
+    universe = BoxUniverse(
+        size=5, gravity=Vector(0, -1), integrator=collisions
+    )
+    universe.add_all([
+        Circle(1, Vector(0, -4), Vector(0, 0), None, 1),
+        Circle(1, Vector(0, 0), Vector(0, 0), None, 1),
+    ])
+    exhaust(universe.simulate(3, 0.01))
+    lower, upper = universe.bodies
+    assert collisions.collisions > 0
+    assert lower.r[1] >= -4 - 1e-9
+    assert (upper.r - lower.r).norm >= 2 - 1e-9
+
+
+def test_hard_sphere_integrator_keeps_the_engine():
+    class BoxUniverse(BoxMixin, RadioactivityMixin, Universe):
+        pass
+
+    def make_universe(collisions):
+        rng = np.random.default_rng(1)
+        universe = BoxUniverse(
+            size=5, gravity=Vector(0, 0), integrator=collisions
+        )
+        universe.add_all(
+            Circle(0.3, Vector(x, y), Vector(*rng.normal(size=2)), None, 1)
+            for x in range(-4, 5, 2) for y in range(-4, 5, 2)
+        )
+        return universe
+
+    kept = HardSphereCollisions()
+    rebuilt = HardSphereCollisions()
+    universes = make_universe(kept), make_universe(rebuilt)
+    for n in range(100):
+        if n == 50:
+            for universe in universes:
+                universe.bodies[0].v = Vector(3, 0)
+        rebuilt.spheres = None
+        for universe in universes:
+            universe.step(0.05)
+            universe.time += 0.05
+    assert kept.rebuilds == 1 and rebuilt.rebuilds == 100
+    assert kept.collisions == rebuilt.collisions > 0
+    for body, other in zip(*universes):
+        assert (body.r - other.r).norm < 1e-9
+        assert (body.v - other.v).norm < 1e-9
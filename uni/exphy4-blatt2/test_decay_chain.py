@@ -0,0 +1,26 @@
+import math
+
+import numpy as np
+
+from decay_chain import *
+
+
+def test_binomial_steps_match_bateman():
+    λ = [math.log(2) / 10, math.log(2) / 3, 0]
+    chain = DecayChain(λ, [10 ** 9, 0, 0], seed=1)
+    times, counts = zip(*chain.simulate(20, 0.001))
+    expected = bateman(λ, [10 ** 9, 0, 0], times)
+    assert np.all(np.abs(np.array(counts) - expected) < 0.001 * 10 ** 9)
+    assert np.all(np.array(counts).sum(axis=1) == 10 ** 9)
+    assert abs(half_life(times, np.array(counts)[:, 0]) - 10) < 0.01
+
+
+def test_gillespie_matches_bateman():
+    λ = [1, 0.5]
+    chain = DecayChain(λ, [2000, 0], seed=2)
+    times, counts = zip(*chain.gillespie(3, 0.5))
+    assert len(times) == 7
+    assert chain.time == 3
+    expected = bateman(λ, [2000, 0], times)
+    assert np.all(np.abs(np.array(counts) - expected) < 150)
+    assert np.all(np.array(counts).sum(axis=1) == 2000)
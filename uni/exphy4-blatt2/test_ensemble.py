@@ -0,0 +1,27 @@
+from ensemble import *
+from jim import *
+
+
+class DecayUniverse(RadioactivityMixin, Universe):
+    pass
+
+
+def decay_box(seed, number_of_bodies):
+    universe = DecayUniverse(Vector(0, 0))
+    universe.add_all(
+        RadioactiveBody(1, random_vector(4, 2), Vector(0, 0), None, 1)
+        for _ in range(number_of_bodies)
+    )
+    return universe
+
+
+def test_ensemble_is_deterministic():
+    grid = parameter_grid(number_of_bodies=[10, 20])
+    reduce = BodyCount(1, 0.1)
+    serial = sorted(run_ensemble(decay_box, grid, reduce, 3, processes=1))
+    parallel = sorted(run_ensemble(decay_box, grid, reduce, 3, processes=2))
+    assert serial == parallel
+    assert [index for index, _, _ in serial] == list(range(6))
+    counts = [result for _, _, result in serial]
+    assert len(set(map(tuple, counts))) > 1
+    assert all(result[0] in (10, 20) for result in counts)
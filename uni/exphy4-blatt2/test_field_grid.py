@@ -0,0 +1,75 @@
+import math
+from functools import partial
+
+import numpy as np
+import pytest
+
+from jim import *
+from field_grid import *
+
+
+def smooth_field(r):
+    x, y, z = r
+    return Vector(0, 0, 0.1 * z), Vector(math.sin(y / 3), math.cos(x / 3), 1)
+
+
+def test_interpolation_error():
+    errors = {}
+    for order in (1, 3):
+        grid = FieldGrid.sample(
+            smooth_field, (-10, -10, -10), (10, 10, 10), (21, 21, 21), order
+        )
+        errors[order] = grid.error(smooth_field)
+    assert errors[1]["max"] < 0.02
+    assert errors[3]["max"] < 0.002
+    E, B = grid(Vector(1, 2, 3))
+    assert (B - smooth_field(Vector(1, 2, 3))[1]).norm < 1e-3
+
+
+def test_memory_mapped_cache(tmp_path):
+    path = str(tmp_path / "field.npy")
+    grid = FieldGrid.sample(smooth_field, (-1, -1, -1), (1, 1, 1), (5, 6, 7),
+                            path=path)
+    calls = []
+
+    def counting_field(r):
+        calls.append(r)
+        return smooth_field(r)
+
+    cached = FieldGrid.sample(
+        counting_field, (-1, -1, -1), (1, 1, 1), (5, 6, 7), path=path
+    )
+    # Only the points that check the cache are evaluated.
+    assert len(calls) == 3
+    assert isinstance(cached.values, np.memmap)
+    assert np.array_equal(cached.values, grid.values)
+
+    # Caches of other lattices or other fields are not used.
+    with pytest.raises(ValueError):
+        FieldGrid.sample(smooth_field, (-2, -1, -1), (1, 1, 1), (5, 6, 7),
+                         path=path)
+    with pytest.raises(ValueError):
+        FieldGrid.sample(lambda r: smooth_field(2 * r), (-1, -1, -1),
+                         (1, 1, 1), (5, 6, 7), path=path)
+
+
+def test_gridded_lorentz_force_matches_field():
+    def make_universe():
+        universe = Universe(Vector(0, 0, 0), integrator="rk4")
+        for n in range(3):
+            body = Body(Vector(5 + n, 0, 0), Vector(0, 2, 0.1), None, 1)
+            body.q = 2
+            universe.add(body)
+        return universe
+
+    universe = make_universe()
+    implement_field(universe, partial(lorentz_force, field=smooth_field))
+    gridded = make_universe()
+    implement_gridded_field(
+        gridded, smooth_field, (-10, -10, -10), (10, 10, 10), (21, 21, 21),
+        order=3,
+    )
+    exhaust(universe.simulate(2, 0.01))
+    exhaust(gridded.simulate(2, 0.01))
+    for body, gridded_body in zip(universe, gridded):
+        assert (body.r - gridded_body.r).norm < 0.005
@@ -1,3 +1,7 @@
+import random
+
+import pytest
+
 from jim import *
 
 
@@ -41,3 +45,475 @@ def test_transpose_states():
     ]
     print(transpose_states(states))
     assert transpose_states(states) == [(1, 3), (2, 4)]
+
+
+def test_integrators():
+    def energy_error(integrator):
+        universe = Universe(Vector(0, 0), integrator=integrator)
+        body = Body(Vector(1, 0), Vector(0, 0), lambda body: -body.r, 1)
+        universe.add(body)
+        exhaust(universe.simulate(10, 0.1))
+        return abs(0.5 * body.v.norm ** 2 + 0.5 * body.r.norm ** 2 - 0.5)
+
+    errors = {name: energy_error(name) for name in INTEGRATORS}
+    print(errors)
+    assert errors["euler"] > 0.01
+    assert errors["velocity_verlet"] < 0.001
+    assert errors["leapfrog"] < 0.001
+    assert errors["rk4"] < 0.0001
+    assert errors["yoshida4"] < 0.0001
+
+
+def test_integrators_support_planets_and_first_order_bodies():
+    class Decay(object):
+        def __init__(self, r):
+            self.r = r
+
+        @property
+        def v(self):
+            return -self.r
+
+    planet = Planet(0, 1, 1, 1)
+    decay = Decay(Vector(1))
+    universe = Universe(Vector(0), integrator="rk4")
+    universe.add_all([planet, decay])
+    for _ in range(10):
+        universe.step(0.1)
+    assert abs(planet.phi - 1) < 0.0000001
+    assert abs(decay.r[0] - math.exp(-1)) < 0.000001
+
+
+def test_simulate_adaptive():
+    universe = Universe(Vector(0, 0))
+    body = Body(Vector(1, 0), Vector(0, 1), lambda body: -body.r, 1)
+    universe.add(body)
+    states = list(universe.simulate_adaptive(10, 0.5, rtol=1e-8, atol=1e-10))
+    assert len(states) == 21
+    for n, (state,) in enumerate(states):
+        t = n * 0.5
+        assert (state.r - Vector(math.cos(t), math.sin(t))).norm < 0.000001
+    assert universe.time == 10
+    accepted, rejected = universe.adaptive_steps
+    assert accepted < 200
+
+    planet = Planet(0, 1, 1, 1)
+    universe = Universe(Vector(0, 0))
+    universe.add_all([planet, Body(Vector(1, 0), Vector(0, 1), None, 1)])
+    for n, states in enumerate(universe.simulate_adaptive(2, 0.5)):
+        assert abs(states[0].phi - n * 0.5) < 1e-9
+    assert abs(planet.phi - 2) < 1e-9
+
+
+def test_simulate_adaptive_runs_after_step():
+    class BoxUniverse(BoxMixin, RadioactivityMixin, Universe):
+        pass
+
+    universe = BoxUniverse(size=1, gravity=Vector(0, 0))
+    body = Body(Vector(0.5, 0), Vector(1, 0), None, 1)
+    decaying = RadioactiveBody(1, Vector(0, 0), Vector(0, 0), None, 1)
+    decaying.lifetime = 1.2
+    universe.add_all([body, decaying])
+    states = list(universe.simulate_adaptive(2, 0.25))
+    assert len(states) == 9
+    # The body bounces back from the wall at x = 1 ...
+    xs = [state[0].r[0] for state in states]
+    assert max(xs) < 1.3
+    assert xs[-1] == pytest.approx(xs[-2] - 0.25)
+    # ... and the other one decays in the step that ends at 1.25.
+    assert [len(state) for state in states] == [2] * 5 + [1] * 4
+    assert universe.bodies == [body]
+
+    class StepUniverse(Universe):
+        def step(self, dt):
+            super().step(dt)
+
+    with pytest.raises(TypeError):
+        next(StepUniverse(Vector(0, 0)).simulate_adaptive(1, 0.5))
+
+
+def test_block_timesteps():
+    def make_universe(integrator):
+        universe = Universe(Vector(0, 0), integrator=integrator)
+        fast = Body(Vector(1, 0), Vector(0, 1), lambda body: -body.r, 1)
+        slow = Body(Vector(1, 0), Vector(0, 0.01), lambda body: -body.r * 0.0001, 1)
+        universe.add_all([fast, slow])
+        return universe
+
+    blocks = BlockTimesteps(levels=6, η=0.01)
+    universe = make_universe(blocks)
+    reference = make_universe("rk4")
+    exhaust(universe.simulate(5, 0.5))
+    exhaust(reference.simulate(5, 0.5 / 64))
+    for body, reference_body in zip(universe, reference):
+        assert (body.r - reference_body.r).norm < 0.001
+    # A shared step would need 2 * 10 * 64 evaluations.
+    assert blocks.evaluations < 0.6 * 2 * 10 * 64
+
+
+def test_block_timesteps_see_changes_between_steps():
+    class BoxUniverse(BoxMixin, RadioactivityMixin, Universe):
+        pass
+
+    universe = BoxUniverse(
+        size=1, gravity=Vector(0, 0), integrator=BlockTimesteps(levels=3)
+    )
+    body = Body(Vector(0.95, 0), Vector(1, 0), None, 1)
+    universe.add(body)
+    xs = []
+    for _ in range(4):
+        universe.step(0.1)
+        xs.append(body.r[0])
+    assert xs == pytest.approx([1.05, 0.95, 0.85, 0.75])
+    body.v = Vector(0, 0)
+    universe.step(0.1)
+    assert body.r[0] == pytest.approx(0.75)
+
+
+def test_vector_products():
+    V = Vector
+    assert V(1, 2, 3) * V(4, 5, 6) == 32
+    assert tuple((V(1, 0, 0) @ V(0, 1, 0)).xs) == (0, 0, 1)
+    assert tuple(V(3, 4).project_onto(V(1, 0)).xs) == (3, 0)
+    assert tuple((V(1, 2).add_scaled(V(1, 1), 2)).xs) == (3, 4)
+    assert tuple((V(1, 2, 3, 4) - V(1, 1, 1, 1)).xs) == (0, 1, 2, 3)
+    try:
+        V(1, 2) + V(1, 2, 3)
+    except DimensionError:
+        pass
+    else:
+        assert False
+
+
+def test_acceleration_is_evaluated_once_per_step():
+    evaluations = []
+
+    def count(body):
+        evaluations.append(body)
+        return Vector(0, -1)
+
+    universe = Universe(Vector(0, 0))
+    body = Body(Vector(0, 0), Vector(1, 0), None, 1)
+    body.add_acceleration(count, velocity_dependent=False)
+    universe.add(body)
+    states = []
+    for state in universe.simulate(1, 0.1):
+        states.append(state)
+        body.f
+    assert len(evaluations) == len(states)
+
+    # Velocity dependent accelerations are evaluated again after `v`
+    # changed, so that the states are consistent.
+    universe = Universe(Vector(0, 0))
+    body = Body(Vector(0, 0), Vector(2, 0), None, 1)
+    universe.add(body)
+    implement_field(universe, friction)
+    for state, in universe.simulate(1, 0.1):
+        assert (state.a - friction(state)).norm < 1e-12
+
+    # Coupled forces are evaluated once per phase, not once per body
+    # that moves.
+    for integrator, extra in [("velocity_verlet", 0), ("euler", 190)]:
+        random.seed(2)
+        universe = Universe(Vector(0, 0, 0), integrator=integrator)
+        universe.add_all(
+            Body(random_vector(10), random_vector(1), None, 1e9)
+            for _ in range(20)
+        )
+        pairs = implement_universal_force(universe, gravitate)
+        universe.state()
+        for _ in range(3):
+            universe.step(0.01)
+            evaluations = pairs.evaluations
+            universe.state()
+            assert pairs.evaluations - evaluations == extra
+            universe.time += 0.01
+
+
+def test_force_registry():
+    universe = Universe(Vector(0, -1), integrator="velocity_verlet")
+    bodies = [
+        Body(Vector(0, 0), Vector(0, 0), None, 1),
+        Body(Vector(1, 0), Vector(0, 0), None, 2),
+        Body(Vector(0, 2), Vector(1, 0), None, 3),
+    ]
+    for body in bodies:
+        body.q = 1e-5
+    universe.add_all(bodies)
+    pairs = implement_universal_force(universe, coulomb_force)
+    spring = universe.add_force(Spring(1, 2, bodies[1:], attach=False))
+    drag = universe.add_force(Dissipation(friction, bodies[:1]))
+
+    batched = universe.compute_accelerations()
+    assert pairs.evaluations == 3
+    assert spring.evaluations == 1
+    assert drag.evaluations == 1
+    universe.epoch += 1
+    for body, a in zip(bodies, batched):
+        assert (body.a - a).norm < 0.0000001
+
+    bodies[2].r = Vector(0, 3)
+    expected = Vector(0, -1) + (
+        coulomb_force(bodies[0], bodies[1]) + coulomb_force(bodies[0], bodies[2])
+    )
+    assert (bodies[0].a - expected).norm < 0.0000001
+
+
+def test_batched_pair_forces():
+    random.seed(1)
+    universe = Universe(Vector(0, 0, 0))
+    for _ in range(2 * SINGLE_BATCH_SIZE):
+        body = Body(random_vector(10), Vector(0, 0, 0), None,
+                    random.uniform(1, 2))
+        body.q = random.uniform(-1e-5, 1e-5)
+        universe.add(body)
+    for force in (gravitate, coulomb_force):
+        pairs = implement_universal_force(universe, force)
+        assert pairs.batched(universe.bodies, single=True)
+        batched = universe.compute_accelerations()
+        single = pairs.acceleration(universe, universe.bodies[0])
+        exact = [
+            sum((force(body, other) for other in universe
+                 if other is not body), Vector(0, 0, 0)) / body.m
+            for body in universe
+        ]
+        for a, expected in zip(batched, exact):
+            assert (a - expected).norm <= 1e-9 * expected.norm
+        assert (single - exact[0]).norm <= 1e-9 * exact[0].norm
+        potential = PAIR_POTENTIALS[force]
+        bodies = universe.bodies
+        expected = sum(
+            potential(body, bodies[j])
+            for i, body in enumerate(bodies)
+            for j in range(i + 1, len(bodies))
+        )
+        assert abs(pairs.potential_energy(universe) - expected) <= (
+            1e-9 * abs(expected)
+        )
+        universe.remove_force(pairs)
+
+
+def test_checkpoint(tmp_path):
+    class DecayUniverse(BoxMixin, RadioactivityMixin, Universe):
+        pass
+
+    def make_universe():
+        random.seed(3)
+        universe = DecayUniverse(size=5, gravity=Vector(0, -1))
+        universe.add_all(
+            RadioactiveBody(1, random_vector(4, 2), random_vector(1, 2), None, 1)
+            for _ in range(20)
+        )
+        implement_field(universe, friction)
+        return universe
+
+    def run(universe):
+        exhaust(universe.simulate(0.5, 0.01))
+        return [(tuple(body.r), tuple(body.v)) for body in universe]
+
+    universe = make_universe()
+    run(universe)
+    universe.checkpoint(str(tmp_path / "checkpoint"))
+    expected = run(universe)
+
+    resumed = make_universe()
+    resumed.restore(str(tmp_path / "checkpoint"))
+    assert run(resumed) == expected
+    assert resumed.time == universe.time
+
+
+def test_checkpoint_is_checked_before_restoring(tmp_path):
+    class DecayUniverse(RadioactivityMixin, Universe):
+        pass
+
+    def field(r):
+        return Vector(0, 0, 0), Vector(0, 0, 1)
+
+    def make_universe(B=field):
+        universe = DecayUniverse(Vector(0, 0, 0))
+        bodies = [
+            RadioactiveBody(1, Vector(n, 0, 0), Vector(0, 1, 0), None, 1)
+            for n in range(3)
+        ]
+        for body in bodies:
+            body.q = 1
+        bodies[0].lifetime = 0.05
+        universe.add_all(bodies)
+        universe.add_force(
+            Field(partial(lorentz_force, field=B), bodies=bodies)
+        )
+        return universe
+
+    universe = make_universe()
+    exhaust(universe.simulate(0.1, 0.01))
+    assert len(universe.bodies) == 2
+    description = repr(universe.forces[0])
+    assert "0x" not in description
+    assert "lorentz_force(field=" in description
+    assert "bodies=2" in description
+    universe.checkpoint(str(tmp_path / "checkpoint"))
+
+    resumed = make_universe()
+    resumed.restore(str(tmp_path / "checkpoint"))
+    assert resumed.time == universe.time
+    assert len(resumed.bodies) == 2
+
+    other = make_universe(B=lambda r: field(r))
+    before = [tuple(body.r) for body in other.bodies]
+    state = random.getstate()
+    with pytest.raises(ValueError, match="forces"):
+        other.restore(str(tmp_path / "checkpoint"))
+    assert [tuple(body.r) for body in other.bodies] == before
+    assert len(other.bodies) == 3
+    assert other.time == 0
+    assert random.getstate() == state
+
+
+def test_decay_queue():
+    class DecayUniverse(BoxMixin, RadioactivityMixin, Universe):
+        pass
+
+    random.seed(5)
+    universe = DecayUniverse(size=5, gravity=Vector(0, 0))
+    universe.add_all(
+        RadioactiveBody(1, random_vector(4, 2), Vector(0, 0), None, 1)
+        for _ in range(2000)
+    )
+    stable = Body(Vector(0, 0), Vector(0, 0), None, 1)
+    universe.add(stable)
+    trap = universe.add_force(HarmonicTrap(0, bodies=universe.bodies[:-1]))
+    exhaust(universe.simulate(1, 0.01))
+    assert abs(len(universe.bodies) - 1 - 2000 * math.exp(-1)) < 100
+    assert stable in universe.bodies
+    # Decayed bodies are discarded from the forces, too.
+    assert set(trap.bodies) == set(universe.bodies) - {stable}
+    assert all(
+        trap.bodies[n] is body for body, n in trap._targets.items()
+    )
+    assert all(body.decay_time > universe.time for body in universe.bodies
+               if does_decay(body))
+    count = len(universe.bodies)
+    universe.do_decays(0)
+    assert len(universe.bodies) == count
+
+
+def test_boris_gyration_and_drift():
+    def gyrate(integrator, E, steps, dt):
+        universe = Universe(Vector(0, 0, 0), integrator=integrator)
+        body = Body(Vector(1, 0, 0), Vector(0, 1, 0), None, 1)
+        body.q = -1
+        universe.add(body)
+        implement_field(
+            universe,
+            partial(lorentz_force, field=lambda r: (E, Vector(0, 0, 1))),
+        )
+        start = body.r
+        for _ in range(steps):
+            universe.step(dt)
+        return body, (body.r - start) / (steps * dt)
+
+    # Ten steps per gyration period 2π.
+    dt = 2 * math.pi / 10
+    body, _ = gyrate("boris", Vector(0, 0, 0), 1000, dt)
+    assert abs(body.v.norm - 1) < 1e-12
+    assert abs(body.r.norm - 1) < 0.1
+    euler_body, _ = gyrate("euler", Vector(0, 0, 0), 1000, dt)
+    assert euler_body.v.norm > 2
+
+    # E × B drift with |E| / |B| = 0.1.
+    _, drift = gyrate("boris", Vector(0, 0.1, 0), 1000, dt)
+    assert (drift - Vector(0.1, 0, 0)).norm < 0.01
+
+    relativistic = Boris(relativistic=True, c=2)
+    body, _ = gyrate(relativistic, Vector(0, 0, 0), 1000, dt)
+    assert abs(body.v.norm - 1) < 1e-12
+
+
+def test_conservation_monitor():
+    universe = Universe(Vector(0, 0, 0), integrator="velocity_verlet")
+    sun = Body(Vector(0, 0, 0), Vector(0, -0.01, 0), None, 1 / G)
+    planet = Body(Vector(1, 0, 0), Vector(0, 1, 0), None, 0.01 / G)
+    universe.add_all([sun, planet])
+    implement_universal_force(universe, gravitate)
+    monitor = universe.add_monitor(ConservationMonitor(universe, interval=10))
+    assert monitor.conserved
+    start = monitor.measure()
+    assert abs(start.potential + 0.01 / G) < 1e-6 / G
+    for _ in range(600):
+        universe.step(0.01)
+        universe.time += 0.01
+    assert len(monitor.samples) == 60
+    assert monitor.drift(start) < 1e-4
+    assert (monitor.samples[-1].momentum - start.momentum).norm < 1e-9 / G
+    assert (
+        monitor.samples[-1].angular_momentum - start.angular_momentum
+    ).norm < 1e-9 / G
+
+    universe.add_force(Dissipation(friction))
+    assert not monitor.conserved
+
+
+def test_conservation_monitor_with_attached_spring():
+    universe = Universe(Vector(0, 0), integrator="velocity_verlet")
+    bodies = [
+        Body(Vector(-0.75, 0), Vector(0, 0.5), None, 1),
+        Body(Vector(0.75, 0), Vector(0, -0.5), None, 1),
+    ]
+    universe.add_all(bodies)
+    spring = Spring(1, 4, bodies)
+    assert not ConservationMonitor(universe).conserved
+    monitor = ConservationMonitor(universe, forces=universe.forces + [spring])
+    assert monitor.conserved
+    start = monitor.measure()
+    assert abs(start.potential - 0.5 * 4 * 0.5 ** 2) < 1e-12
+    exhaust(monitor.simulate(2, 0.1, steplen=0.05, budget=1e-4))
+    assert monitor.drift(start, monitor.measure()) < 1e-3
+
+    bodies[0].add_force(friction)
+    assert not monitor.conserved
+
+
+def test_step_length_control():
+    def make_universe(integrator):
+        universe = Universe(Vector(0, 0), integrator=integrator)
+        universe.add(Body(Vector(1, 0), Vector(0, 0), None, 1))
+        universe.add_force(HarmonicTrap(2 * math.pi))
+        return universe
+
+    universe = make_universe("euler")
+    monitor = ConservationMonitor(universe)
+    exhaust(monitor.simulate(1, 0.125, steplen=0.05, budget=1e-3))
+    assert abs(universe.time - 1) < 1e-9
+    assert max(monitor.steplens) < 0.05
+    body, = universe.bodies
+    assert abs(0.5 * body.v.norm ** 2 + 2 * math.pi ** 2 * body.r.norm ** 2
+               - 2 * math.pi ** 2) < 0.02 * 2 * math.pi ** 2
+
+    universe = make_universe("velocity_verlet")
+    monitor = ConservationMonitor(universe)
+    exhaust(monitor.simulate(1, 0.125, steplen=0.0005, budget=1e-2))
+    assert monitor.steplens[-1] > 0.0005
+
+
+def test_conservation_monitor_in_magnetic_field():
+    def circular_field(r):
+        return Vector(0, 0, 1) @ (r - r[2] * Vector(0, 0, 1)).unit
+
+    universe = Universe(Vector(0, 0, 0))
+    body = Body(Vector(5, 0, 0), Vector(0, 2, 0), None, 1)
+    body.q = 2
+    universe.add(body)
+    field = implement_field(universe, partial(
+        lorentz_force,
+        field=lambda r: (Vector.null_vector(3), circular_field(r)),
+    ))
+    monitor = ConservationMonitor(universe)
+    assert monitor.conserved
+    assert monitor.measure().potential == 0
+    exhaust(monitor.simulate(1, 0.125, steplen=0.0005, budget=1e-3))
+    assert abs(body.v.norm - 2) < 2e-3
+
+    universe.remove_force(field)
+    implement_field(universe, partial(
+        lorentz_force, field=lambda r: (Vector(1, 0, 0), circular_field(r)),
+    ))
+    assert not monitor.conserved
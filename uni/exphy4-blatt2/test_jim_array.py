@@ -0,0 +1,290 @@
+import random
+from functools import partial
+
+import numpy as np
+import pytest
+
+import jim
+from jim import *
+from jim_array import *
+
+
+def test_array_universe_matches_universe():
+    def make_bodies():
+        return [
+            Body(Vector(1, 2), Vector(0, 1), None, 1),
+            Body(Vector(-3, 0), Vector(2, 0), None, 2),
+        ]
+    universe = Universe(Vector(0, -1))
+    universe.add_all(make_bodies())
+    array_universe = ArrayUniverse(Vector(0, -1))
+    array_universe.add_all(make_bodies())
+
+    for states, array_states in zip(
+            universe.simulate(1, 0.1), array_universe.simulate(1, 0.1)):
+        for state, array_state in zip(states, array_states):
+            assert (state.r - array_state.r).norm < 0.0000001
+            assert (state.v - array_state.v).norm < 0.0000001
+            assert (state.a - array_state.a).norm < 0.0000001
+
+
+def test_array_box():
+    class BoxUniverse(ArrayBoxMixin, ArrayUniverse):
+        pass
+    universe = BoxUniverse(size=1, gravity=Vector(0, 0))
+    universe.add(Body(Vector(0.95, 0), Vector(1, 1), None, 1))
+    universe.step(0.1)
+    body, = universe
+    assert tuple(body.v) == (-1, 1)
+
+
+def test_batched_pair_force_matches_implement_universal_force():
+    def make_bodies():
+        bodies = [
+            Body(Vector(0, 0, 0), Vector(0, 0, 0), None, 1),
+            Body(Vector(1, 0, 0), Vector(0, 0, 0), None, 2),
+            Body(Vector(0, 3, 1), Vector(0, 0, 0), None, 3),
+        ]
+        for body, q in zip(bodies, (1e-5, -2e-5, 3e-5)):
+            body.q = q
+        return bodies
+    for force in (gravitate, coulomb_force):
+        universe = Universe(Vector(0, 0, 0))
+        universe.add_all(make_bodies())
+        jim.implement_universal_force(universe, force)
+        array_universe = ArrayUniverse(Vector(0, 0, 0))
+        array_universe.add_all(make_bodies())
+        implement_batched_force(array_universe, force)
+        for body, array_body in zip(universe, array_universe):
+            assert (body.a - array_body.a).norm <= 1e-9 * body.a.norm
+
+
+def test_array_universe_takes_universe_forces():
+    def make_bodies():
+        bodies = [
+            Body(Vector(0, 0, 0), Vector(0.5, 0, 0), None, 1),
+            Body(Vector(1, 0, 0), Vector(0, 2, 0), None, 2),
+            Body(Vector(0, 3, 1), Vector(0, 0, 0.8), None, 3),
+        ]
+        for body, q in zip(bodies, (1e-5, -2e-5, 3e-5)):
+            body.q = q
+        return bodies
+
+    def uniform_field(r):
+        return Vector(0, 1, 0), Vector(0, 0, 1)
+
+    universe = Universe(Vector(0, 0, 0))
+    universe.add_all(make_bodies())
+    array_universe = ArrayUniverse(Vector(0, 0, 0))
+    array_universe.add_all(make_bodies())
+    for u in (universe, array_universe):
+        jim.implement_universal_force(u, coulomb_force)
+        jim.implement_field(u, friction)
+        jim.implement_field(u, partial(lorentz_force, field=uniform_field))
+    for state, array_state in zip(universe.state(), array_universe.state()):
+        assert (state.a - array_state.a).norm < 1e-9 * state.a.norm
+
+    with pytest.raises(TypeError):
+        jim.implement_universal_force(
+            array_universe, lambda body, other: body.r - other.r
+        )
+    with pytest.raises(TypeError):
+        next(iter(array_universe)).add_force(friction)
+
+
+def test_array_universe_rejects_jim_mixins():
+    with pytest.raises(TypeError, match="ArrayRadioactivityMixin"):
+        class Universe(BoxMixin, RadioactivityMixin, ArrayUniverse):
+            pass
+
+    class Universe(ArrayBoxMixin, ArrayRadioactivityMixin, ArrayUniverse):
+        pass
+
+    universe = Universe(size=5, gravity=Vector(0, 0), seed=0)
+    universe.add_all(
+        RadioactiveBody(1, random_vector(4, 2), random_vector(1, 2), None, 1)
+        for _ in range(10)
+    )
+    universe.add_force(lambda universe: array_friction(universe) / 10)
+    exhaust(universe.simulate(1, 0.1))
+    assert len(universe) < 10
+
+
+def test_array_universe_rejects_bodies_with_accelerations():
+    universe = ArrayUniverse(Vector(0, 0))
+    with pytest.raises(ValueError):
+        universe.add(Body(Vector(1, 0), Vector(0, 0), lambda b: -b.r, 1))
+    assert len(universe) == 0
+
+
+def test_short_range_force_only_sees_close_pairs():
+    class BoxUniverse(ArrayBoxMixin, ArrayUniverse):
+        pass
+    universe = BoxUniverse(size=10, gravity=Vector(0, 0))
+    universe.add_all(
+        Body(random_vector(10, 2), Vector(0, 0), None, 1)
+        for _ in range(400)
+    )
+    force = ShortRangeForce(soft_sphere(2, 1.5))
+    d = universe.r[:, None, :] - universe.r[None, :, :]
+    distance = np.sqrt((d ** 2).sum(axis=2))
+    np.fill_diagonal(distance, np.inf)
+    overlap = np.where(distance < 1.5, 1.5 - distance, 0)
+    expected = (2 * overlap / np.where(overlap > 0, distance, 1))[..., None] * d
+    assert np.allclose(force(universe), expected.sum(axis=1))
+    universe.step(0.001)
+    force(universe)
+    assert force.neighbours.rebuilds == 1
+
+
+def test_recorder(tmp_path):
+    universe = ArrayUniverse(Vector(0, 0, -1))
+    universe.add_all(
+        Body(Vector(n, 0, 0), Vector(0, 1, 0), None, 1) for n in range(3)
+    )
+    recorder = Recorder(11, 3, fields=("r", "v", "m"), path=str(tmp_path))
+    recorder.simulate(universe, 1, 0.1, steplen=0.05)
+    recorder.flush()
+    assert recorder["r"].shape == (recorder.frames, 3, 3)
+    assert recorder["m"].shape[1:] == (3,)
+    assert np.allclose(recorder["r"][-1], universe.r)
+    assert np.allclose(recorder["time"][-1], universe.time)
+    assert np.allclose(np.load(str(tmp_path / "r.npy"))[:recorder.frames], recorder["r"])
+
+    objects = Universe(Vector(0, 0, -1))
+    objects.add_all(
+        Body(Vector(n, 0, 0), Vector(0, 1, 0), None, 1) for n in range(3)
+    )
+    object_recorder = Recorder(11, 3).simulate(objects, 1, 0.1, steplen=0.05)
+    assert np.allclose(object_recorder["r"], recorder["r"])
+
+
+def test_recorder_keeps_columns_of_decayed_bodies():
+    class DecayUniverse(RadioactivityMixin, Universe):
+        pass
+
+    class ArrayDecayUniverse(ArrayRadioactivityMixin, ArrayUniverse):
+        pass
+
+    random.seed(3)
+    for universe in (DecayUniverse(Vector(0, 0)),
+                     ArrayDecayUniverse(Vector(0, 0), seed=3)):
+        universe.add_all(
+            RadioactiveBody(2, Vector(n, 0), Vector(0, 1), None, 1)
+            for n in range(20)
+        )
+        recorder = Recorder(21, 20).simulate(universe, 1, 0.05)
+        assert len(universe.bodies) < 20
+        xs = recorder["r"][:, :, 0]
+        decayed = np.isnan(xs)
+        # Every column holds one body until it decays, and stays empty
+        # afterwards.
+        assert np.all(decayed[:-1] <= decayed[1:])
+        assert np.all(np.where(decayed, xs[0], xs) == np.arange(20))
+        assert decayed[-1].sum() == 20 - len(universe.bodies)
+
+
+def test_trace_history():
+    universe = Universe(Vector(0, 0))
+    universe.add_all(
+        Body(Vector(n, 0), Vector(0, 1), None, 1) for n in range(2)
+    )
+    history = TraceHistory(capacity=2)
+    states = list(history.feed(universe.simulate(1, 0.1)))
+    assert len(history) == len(states) == 10
+    xs, ys = history.trace(1, 4)
+    assert list(xs) == [1] * 4
+    assert np.allclose(ys, [0, 0.1, 0.2, 0.3])
+    assert history.tail(3, 4).shape == (3, 2, 2)
+    assert np.shares_memory(history.trace(0, k=3), history.upto(10))
+
+
+def test_trace_history_keeps_columns():
+    class DecayUniverse(RadioactivityMixin, Universe):
+        pass
+
+    universe = DecayUniverse(Vector(0, 0))
+    history = TraceHistory(capacity=1)
+    history.append(universe.state(), universe)
+    bodies = [Body(Vector(n, 0), Vector(0, 1), None, 1) for n in range(3)]
+    universe.add_all(bodies)
+    history.append(universe.state(), universe)
+    # The last body takes the place of the first one.
+    universe.remove(bodies[0])
+    assert universe.bodies[0] is bodies[2]
+    history.append(universe.state(), universe)
+    assert history.upto(3).shape == (3, 3, 2)
+    assert np.isnan(history.upto(1)).all()
+    xs, _ = history.trace(history.columns[bodies[2].serial])
+    assert list(xs[1:]) == [2, 2]
+    xs, _ = history.trace(history.columns[bodies[0].serial])
+    assert xs[1] == 0 and np.isnan(xs[2])
+
+
+def test_array_checkpoint(tmp_path):
+    class DecayUniverse(ArrayRadioactivityMixin, ArrayUniverse):
+        pass
+
+    def make_universe():
+        universe = DecayUniverse(Vector(0, -1), seed=1)
+        universe.add_all(
+            RadioactiveBody(1, Vector(n, 0), Vector(0, 1), None, 1)
+            for n in range(50)
+        )
+        universe.add_force(array_friction)
+        return universe
+
+    universe = make_universe()
+    exhaust(universe.simulate(0.5, 0.01))
+    universe.checkpoint(str(tmp_path / "checkpoint"))
+    exhaust(universe.simulate(0.5, 0.01))
+
+    resumed = make_universe()
+    resumed.restore(str(tmp_path / "checkpoint"))
+    exhaust(resumed.simulate(0.5, 0.01))
+    assert np.array_equal(resumed.r, universe.r)
+    assert np.array_equal(resumed.v, universe.v)
+
+
+def test_field_universe_matches_lorenz_bodies():
+    class AttractorUniverse(Universe):
+        def __init__(self, a, b, c):
+            super().__init__(Vector.null_vector(3), integrator="rk4")
+            self.params = a, b, c
+
+        def add(self, body):
+            super().add(body)
+            body.attractor = self
+
+    class LorenzBody:
+        def __init__(self, r):
+            self.r = r
+
+        @property
+        def v(self):
+            a, b, c = self.attractor.params
+            x, y, z = self.r
+            return Vector(a * (y - x), x * (b - z) - y, x * y - c * z)
+
+    starts = [Vector.random(3, limit=20) for _ in range(4)]
+    attractor = AttractorUniverse(10, 28, 8 / 3)
+    attractor.add_all(LorenzBody(r) for r in starts)
+    field = FieldUniverse(lorenz, (10, 28, 8 / 3))
+    field.add_positions([tuple(r) for r in starts])
+    for _ in range(100):
+        attractor.step(0.005)
+        field.step(0.005)
+    for body, r in zip(attractor.bodies, field.r):
+        assert np.allclose(tuple(body.r), r)
+    assert len(list(field.simulate_shortstep(0.1, 0.05))) == 2
+
+
+def test_field_universe_passes_params_positionally():
+    def decay(t, X, rates):
+        return -rates[0] * X
+
+    for integrator in ["euler", "rk4"]:
+        field = FieldUniverse(decay, (2,), dimension=1, integrator=integrator)
+        field.add_positions([(1,)])
+        field.step(0.01)
+        assert field.r[0, 0] == pytest.approx(math.exp(-0.02), rel=1e-3)
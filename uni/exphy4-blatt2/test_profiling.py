@@ -0,0 +1,57 @@
+import json
+import random
+
+from jim import *
+from jim_array import ArrayUniverse, FieldUniverse, array_friction, lorenz
+from profiling import *
+
+
+def test_profiler(tmp_path):
+    class DecayUniverse(BoxMixin, RadioactivityMixin, Universe):
+        pass
+
+    random.seed(1)
+    universe = DecayUniverse(
+        size=5, gravity=Vector(0, -1), integrator="velocity_verlet"
+    )
+    universe.add_all(
+        RadioactiveBody(1, random_vector(4, 2), random_vector(1, 2), None, 1)
+        for _ in range(50)
+    )
+    implement_field(universe, friction)
+    with Profiler(universe) as profiler:
+        exhaust(universe.simulate(1, 0.1))
+    assert len(profiler.steps) == profiler.calls["step"] == 9
+    assert profiler.calls["check_box"] == 9
+    assert sum(step.removed for step in profiler.steps) == 50 - len(universe.bodies)
+    assert all(step.evaluations > 0 for step in profiler.steps)
+    summary = profiler.summary()
+    assert "compute_accelerations" in summary
+    assert "bodies removed: {}".format(50 - len(universe.bodies)) in summary
+
+    profiler.write_trace(str(tmp_path / "trace.json"))
+    with open(str(tmp_path / "trace.json")) as file:
+        events = json.load(file)["traceEvents"]
+    assert {event["ph"] for event in events} == {"X", "C"}
+
+    # Disabled profilers leave no wrappers behind.
+    assert "step" not in vars(universe)
+    assert "accumulate" not in vars(universe.forces[0])
+    assert universe.integrator is INTEGRATORS["velocity_verlet"]
+
+
+def test_profiler_with_array_universes():
+    universe = ArrayUniverse(Vector(0, -1))
+    universe.add_all(
+        Body(Vector(n, 0), Vector(0, 1), None, 1) for n in range(3)
+    )
+    universe.add_force(array_friction)
+    field = FieldUniverse(lorenz, (10, 28, 8 / 3))
+    field.add_positions([(1, 1, 1)])
+    for u in (universe, field):
+        with Profiler(u) as profiler:
+            exhaust(u.simulate(1, 0.1))
+        assert len(profiler.steps) == 9
+        assert "integrator" not in profiler.calls
+        assert "step" not in vars(u)
+    assert field.integrator == "rk4"
@@ -0,0 +1,74 @@
+import time
+from multiprocessing import Pool
+
+import numpy as np
+import pytest
+
+from render import *
+
+
+def slow_square(x):
+    # Later tasks finish first, so the order has to come from the queue.
+    time.sleep(0.01 * (5 - x % 5))
+    return x * x
+
+
+def test_chunks():
+    assert chunks(10, 4) == [range(0, 4), range(4, 8), range(8, 10)]
+    assert chunks(0, 4) == []
+
+
+def test_ordered_map_keeps_order_and_window():
+    submitted = []
+
+    def tasks():
+        for x in range(20):
+            submitted.append(x)
+            yield x
+
+    with Pool(2) as pool:
+        results = []
+        for result in ordered_map(pool, slow_square, tasks(), window=3):
+            # The window is refilled before `result` is handed out.
+            assert len(submitted) - len(results) <= 3 + 1
+            results.append(result)
+    assert results == [x * x for x in range(20)]
+
+
+def test_ffmpeg_command():
+    command = ffmpeg_command("out.mp4", 640, 480, fps=25)
+    assert command[0] == "ffmpeg"
+    assert command[-1] == "out.mp4"
+    assert "640x480" in command
+    assert command[command.index("-r") + 1] == "25"
+
+
+def setup_points(figure, trajectory):
+    axes = figure.add_subplot(1, 1, 1)
+    axes.set_xlim(-1, 1)
+    axes.set_ylim(-1, 1)
+    points, = axes.plot([], [], "o")
+
+    def draw(i):
+        points.set_data(trajectory["r"][i, :, 0], trajectory["r"][i, :, 1])
+
+    return draw
+
+
+def test_render_chunks():
+    pytest.importorskip("matplotlib")
+    t = np.linspace(0, 1, 10)
+    trajectory = {
+        "time": t,
+        "r": np.stack([np.cos(t), np.sin(t)], axis=-1)[:, None, :],
+    }
+    serial = list(render_chunks(
+        trajectory, setup_points, 64, 48, dpi=16, processes=1, chunk=3
+    ))
+    parallel = list(render_chunks(
+        trajectory, setup_points, 64, 48, dpi=16, processes=2, chunk=3
+    ))
+    assert [len(data) for data in serial] == [3 * 64 * 48 * 4] * 3 + [
+        64 * 48 * 4
+    ]
+    assert serial == parallel
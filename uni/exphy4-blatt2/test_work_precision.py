@@ -0,0 +1,32 @@
+from work_precision import *
+
+
+def test_work_precision():
+    problems = [problem for problem in PROBLEMS
+                if problem.name in ("harmonic", "spring")]
+    results = work_precision(
+        problems, ["euler", "velocity_verlet", "rk4"], steps=(0.1, 0.01)
+    )
+    assert len(results) == 12
+    errors = {
+        (result.problem, result.integrator, result.dt): result.error
+        for result in results
+    }
+    for name in ("harmonic", "spring"):
+        assert (
+            errors[name, "rk4", 0.01]
+            < errors[name, "velocity_verlet", 0.01]
+            < errors[name, "euler", 0.01]
+        )
+        assert errors[name, "rk4", 0.01] < 1e-5
+    best = cheapest(results, 1e-5)
+    assert best["harmonic"].integrator == best["spring"].integrator == "rk4"
+    assert cheapest(results, 0)["spring"] is None
+    assert "velocity_verlet" in table(results)
+
+
+def test_exact_solutions_start_at_initial_state():
+    for problem in PROBLEMS:
+        universe = problem.make("euler")
+        for body, r in zip(universe.bodies, problem.exact(0)):
+            assert (body.r - r).norm < 1e-12
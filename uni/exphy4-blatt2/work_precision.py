@@ -0,0 +1,195 @@
+"""Work–precision comparison of the integrators on problems with known
+solutions.
+
+    python work_precision.py --tolerance 1e-4 --output precision.json
+
+Every problem is run with every integrator and step length; the error
+is the largest distance from the exact positions at the end time,
+relative to the size of the problem, and the work is the wall time.
+`cheapest` then picks the fastest configuration that is accurate
+enough.
+"""
+
+import argparse
+import json
+import math
+import time
+from collections import namedtuple
+from functools import partial
+
+from jim import (
+    G, INTEGRATORS, Body, HarmonicTrap, Spring, Universe, Vector, gravitate,
+    implement_field, implement_universal_force, lorentz_force,
+)
+
+
+Problem = namedtuple("Problem", "name, make, exact, end_time, scale")
+Result = namedtuple("Result", "problem, integrator, dt, steps, error, seconds")
+
+
+def kepler_universe(integrator, e=0.5):
+    # G M = 1, and the planet is so light that the sun stays put.
+    universe = Universe(Vector(0, 0), integrator=integrator)
+    perihelion = 1 - e
+    universe.add_all([
+        Body(Vector(0, 0), Vector(0, 0), None, 1 / G),
+        Body(Vector(perihelion, 0),
+             Vector(0, math.sqrt((1 + e) / perihelion)), None, 1e-12 / G),
+    ])
+    implement_universal_force(universe, gravitate)
+    return universe
+
+
+def kepler_exact(t, e=0.5):
+    """Solve Kepler’s equation `E - e sin E = t` for `a = 1`."""
+    E = t if e < 0.8 else math.pi
+    for _ in range(50):
+        E -= (E - e * math.sin(E) - t) / (1 - e * math.cos(E))
+    planet = Vector(math.cos(E) - e, math.sqrt(1 - e * e) * math.sin(E))
+    return [Vector(0, 0), planet]
+
+
+def harmonic_universe(integrator, ω=2 * math.pi):
+    universe = Universe(Vector(0, 0), integrator=integrator)
+    universe.add(Body(Vector(1, 0), Vector(0, 0.5 * ω), None, 1))
+    universe.add_force(HarmonicTrap(ω))
+    return universe
+
+
+def harmonic_exact(t, ω=2 * math.pi):
+    return [Vector(math.cos(ω * t), 0.5 * math.sin(ω * t))]
+
+
+def uniform_field(r):
+    return Vector(0, 0, 0), Vector(0, 0, 1)
+
+
+def gyration_universe(integrator):
+    # q B / m = 1: gyration with radius 1 and period 2π about the origin.
+    universe = Universe(Vector(0, 0, 0), integrator=integrator)
+    body = Body(Vector(1, 0, 0), Vector(0, 1, 0.1), None, 1)
+    body.q = -1
+    universe.add(body)
+    implement_field(universe, partial(lorentz_force, field=uniform_field))
+    return universe
+
+
+def gyration_exact(t):
+    return [Vector(math.cos(t), math.sin(t), 0.1 * t)]
+
+
+def spring_universe(integrator, D=4, length=1):
+    universe = Universe(Vector(0, 0), integrator=integrator)
+    bodies = [
+        Body(Vector(-0.75, 0), Vector(0, 0), None, 1),
+        Body(Vector(0.75, 0), Vector(0, 0), None, 1),
+    ]
+    universe.add_all(bodies)
+    Spring(length, D, bodies)
+    return universe
+
+
+def spring_exact(t, D=4, length=1):
+    # The distance oscillates about `length` with ω² = D (1/m₁ + 1/m₂).
+    ω = math.sqrt(2 * D)
+    half = (length + 0.5 * math.cos(ω * t)) / 2
+    return [Vector(-half, 0), Vector(half, 0)]
+
+
+PROBLEMS = [
+    Problem("kepler", kepler_universe, kepler_exact, 4 * math.pi, 1),
+    Problem("harmonic", harmonic_universe, harmonic_exact, 4, 1),
+    Problem("gyration", gyration_universe, gyration_exact, 4 * math.pi, 1),
+    Problem("spring", spring_universe, spring_exact, 4, 1),
+]
+
+STEPS = (0.1, 0.03, 0.01, 0.003, 0.001)
+
+
+def run_problem(problem, integrator, dt):
+    universe = problem.make(integrator)
+    steps = max(1, round(problem.end_time / dt))
+    dt = problem.end_time / steps
+    start = time.perf_counter()
+    for _ in range(steps):
+        universe.step(dt)
+        universe.time += dt
+    seconds = time.perf_counter() - start
+    exact = problem.exact(problem.end_time)
+    error = max(
+        (body.r - r).norm for body, r in zip(universe.bodies, exact)
+    ) / problem.scale
+    return Result(
+        problem.name,
+        integrator if isinstance(integrator, str) else repr(integrator),
+        dt, steps, error, seconds,
+    )
+
+
+def work_precision(problems=PROBLEMS, integrators=INTEGRATORS, steps=STEPS):
+    return [
+        run_problem(problem, integrator, dt)
+        for problem in problems
+        for integrator in integrators
+        for dt in steps
+    ]
+
+
+def cheapest(results, tolerance):
+    """The fastest result of every problem with an error of at most
+    `tolerance` (`None` if there is none).
+    """
+    best = {}
+    for result in results:
+        best.setdefault(result.problem, None)
+        if not result.error <= tolerance:
+            continue
+        current = best[result.problem]
+        if current is None or result.seconds < current.seconds:
+            best[result.problem] = result
+    return best
+
+
+def table(results):
+    lines = ["{:<10} {:<16} {:>8} {:>7} {:>10} {:>10}".format(
+        "problem", "integrator", "dt", "steps", "error", "seconds"
+    )]
+    for result in results:
+        lines.append("{:<10} {:<16} {:>8.4g} {:>7} {:>10.3e} {:>10.4f}".format(
+            *result
+        ))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--tolerance", type=float, default=1e-4)
+    parser.add_argument("--problem", action="append",
+                        choices=[problem.name for problem in PROBLEMS])
+    parser.add_argument("--integrator", action="append",
+                        choices=list(INTEGRATORS))
+    parser.add_argument("--output", "-o")
+    args = parser.parse_args(argv)
+    problems = [
+        problem for problem in PROBLEMS
+        if not args.problem or problem.name in args.problem
+    ]
+    results = work_precision(problems, args.integrator or INTEGRATORS)
+    print(table(results))
+    print()
+    for name, result in cheapest(results, args.tolerance).items():
+        if result is None:
+            print("{}: nothing reaches {:g}".format(name, args.tolerance))
+        else:
+            print("{}: {} with dt = {:g} ({:.4f} s, error {:.2e})".format(
+                name, result.integrator, result.dt, result.seconds,
+                result.error,
+            ))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump([result._asdict() for result in results], file,
+                      indent=2)
+
+
+if __name__ == "__main__":
+    main()